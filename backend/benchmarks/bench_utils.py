@@ -0,0 +1,86 @@
+"""Helpers shared by the benchmark scripts."""
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS_DIR = os.path.join(BACKEND_DIR, "benchmarks")
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile; NaN for no samples"""
+    ordered = sorted(samples)
+    if not ordered:
+        return float("nan")
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_http(url, timeout=60.0, process=None):
+    """Poll url until it answers, failing early if process exits"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"{process.args[:3]} exited with {process.returncode} before {url} came up")
+        try:
+            httpx.get(url, timeout=2.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise SystemExit(f"Timed out waiting for {url}")
+
+
+def start_process(args, env=None, cwd=BACKEND_DIR, log_path=None):
+    """Start a child process with its output sent to log_path (or discarded)"""
+    output = open(log_path, "wb") if log_path else subprocess.DEVNULL
+    return subprocess.Popen(
+        args, cwd=cwd, env={**os.environ, **(env or {})},
+        stdout=output, stderr=subprocess.STDOUT
+    )
+
+
+def stop_process(process, timeout=10.0):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def peak_rss_mb(pid):
+    """High-water RSS of a running process from /proc (Linux only; None elsewhere)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def reset_peak_rss(pid):
+    """Reset VmHWM so the next reading covers only what follows (Linux >= 4.0)"""
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def python_command(*args):
+    return [sys.executable, *args]
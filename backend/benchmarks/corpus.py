@@ -0,0 +1,248 @@
+"""
+Synthetic resume corpus for benchmarks.
+
+Generates deterministic resumes in every format the API accepts:
+text PDFs, scanned (image-only) PDFs, DOCX, Naukri-style HTML saved as
+.doc, and PNG/JPEG images, plus the harder shapes the extractor
+benchmarks need (two-column PDFs, table-heavy DOCX, OLE2 .doc). Only
+Pillow and python-docx are needed, both already API dependencies.
+
+    python benchmarks/corpus.py --out /tmp/resumes --count 50 --mix pdf=4,scanned_pdf=1,docx=3,doc=1,image=1
+"""
+import argparse
+import io
+import os
+import random
+
+DEFAULT_MIX = {"pdf": 4, "scanned_pdf": 1, "docx": 3, "doc": 1, "image": 1}
+
+FIRST_NAMES = ["Aarav", "Diya", "Kabir", "Meera", "Rohan", "Sneha", "Vikram", "Ananya", "Arjun", "Priya"]
+LAST_NAMES = ["Sharma", "Patel", "Iyer", "Khan", "Reddy", "Gupta", "Nair", "Das", "Joshi", "Mehta"]
+CITIES = ["Mumbai", "Pune", "Bengaluru", "Delhi", "Chennai", "Hyderabad", "Kolkata"]
+ROLES = ["Sales Executive", "Relationship Manager", "Software Engineer", "Sales Support Associate",
+         "Business Development Manager", "Data Analyst", "Customer Success Manager"]
+SKILLS = ["negotiation", "CRM", "lead generation", "cold calling", "Python", "SQL", "MS Excel",
+          "team leadership", "insurance products", "client onboarding", "React", "FastAPI",
+          "MongoDB", "presentation", "market research", "channel sales"]
+COMPANIES = ["Acme Insurance", "Globex Brokers", "Initech", "Umbrella Finance", "Stark Retail", "Wayne Capital"]
+DEGREES = ["MBA (Marketing)", "B.Com", "B.Tech (Computer Science)", "BBA", "M.Sc (Statistics)", "B.A. (Economics)"]
+
+
+def resume_lines(rng):
+    """A plausible resume as a list of lines, 300-600 words"""
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    role = rng.choice(ROLES)
+    lines = [
+        name,
+        f"{role} | {rng.choice(CITIES)} | {name.split()[0].lower()}@example.com | +91 98{rng.randint(10000000, 99999999)}",
+        "",
+        "SUMMARY",
+        f"{role} with {rng.randint(0, 12)} years of experience across "
+        f"{', '.join(rng.sample(SKILLS, 3))}. Age {rng.randint(21, 40)}.",
+        "",
+        "EXPERIENCE",
+    ]
+    for _ in range(rng.randint(2, 4)):
+        start = rng.randint(2010, 2022)
+        lines.append(f"{rng.choice(ROLES)}, {rng.choice(COMPANIES)} ({start} - {start + rng.randint(1, 3)})")
+        for _ in range(rng.randint(3, 6)):
+            lines.append(
+                f"- Delivered {rng.randint(5, 40)}% growth in {rng.choice(SKILLS)} by owning "
+                f"{rng.choice(SKILLS)} and {rng.choice(SKILLS)} for {rng.randint(5, 80)} key accounts."
+            )
+    lines += [
+        "",
+        "EDUCATION",
+        f"{rng.choice(DEGREES)}, {rng.choice(CITIES)} University, {rng.randint(2005, 2022)}",
+        "",
+        "SKILLS",
+        ", ".join(rng.sample(SKILLS, rng.randint(5, 10))),
+    ]
+    return lines
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("latin-1", "replace").decode("latin-1")
+
+
+def text_pdf(lines, lines_per_page=52, columns=1):
+    """
+    Minimal multi-page PDF with real text objects, so pdfplumber extracts it.
+    With columns=2 each page is laid out in two side-by-side columns.
+    """
+    per_page = lines_per_page * columns
+    pages = [lines[i:i + per_page] for i in range(0, len(lines), per_page)] or [[]]
+    objects = []  # object number = index + 1
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_obj = add(None)  # filled in once the page objects exist
+    page_ids = []
+    column_width = 495 // columns
+    for page_lines in pages:
+        blocks = []
+        for column in range(columns):
+            column_lines = page_lines[column * lines_per_page:(column + 1) * lines_per_page]
+            text = "".join(f"({_pdf_escape(line[:column_width // 5 if columns > 1 else None])}) Tj T* "
+                           for line in column_lines)
+            blocks.append(f"BT /F1 10 Tf 14 TL {50 + column * (column_width + 10)} 800 Td {text}ET")
+        stream = "\n".join(blocks).encode("latin-1")
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_obj, font, content)
+        ))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[pages_obj - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_obj)
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref))
+    return out.getvalue()
+
+
+def page_image(lines, width=850, height=1100):
+    """The resume rendered onto a white page, as a scanner would see it"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    y = 40
+    for line in lines:
+        if y > height - 40:
+            break
+        draw.text((40, y), line, fill="black")
+        y += 16
+    return image
+
+
+def scanned_pdf(lines):
+    out = io.BytesIO()
+    page_image(lines).save(out, format="PDF", resolution=100)
+    return out.getvalue()
+
+
+def image_file(lines, fmt):
+    out = io.BytesIO()
+    page_image(lines).save(out, format=fmt)
+    return out.getvalue()
+
+
+def docx_file(lines):
+    import docx
+
+    document = docx.Document()
+    for line in lines:
+        document.add_paragraph(line)
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def table_docx(lines, rows=40):
+    """DOCX whose content mostly lives in tables, as templated resumes do"""
+    import docx
+
+    rng = random.Random(len(lines))
+    document = docx.Document()
+    document.add_paragraph(lines[0])
+    table = document.add_table(rows=0, cols=3)
+    for line in lines[1:]:
+        cells = table.add_row().cells
+        cells[0].text = line[:30]
+        cells[1].text = line[30:]
+        cells[2].text = rng.choice(SKILLS)
+    for _ in range(rows):
+        cells = table.add_row().cells
+        cells[0].text = rng.choice(COMPANIES)
+        cells[1].text = rng.choice(ROLES)
+        cells[2].text = f"{rng.randint(2010, 2024)}"
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def ole_doc(lines):
+    """
+    Stand-in for a Word 97-2003 .doc: OLE2 compound-file signature followed by
+    UTF-16 and ANSI text runs. python-docx/mammoth reject it just like a real
+    one, so the extractor walks the same fallback chain down to the raw-text scan.
+    """
+    header = bytes.fromhex("D0CF11E0A1B11AE1") + bytes(504)
+    body = "\r".join(lines)
+    return header + body.encode("utf-16-le") + bytes(512) + body.encode("cp1252", "replace")
+
+
+def html_doc(lines):
+    """What Naukri exports as .doc: HTML with a Word extension"""
+    body = "".join(f"<p>{line}</p>" if line else "<br>" for line in lines)
+    return f"<html><head><meta charset='utf-8'></head><body><div>{body}</div></body></html>".encode("utf-8")
+
+
+def make_resume(kind, index, rng):
+    """(filename, content, content_type) for one synthetic resume"""
+    lines = resume_lines(rng)
+    stem = f"{kind}_{index:04d}_{lines[0].replace(' ', '_').lower()}"
+    if kind == "pdf":
+        return f"{stem}.pdf", text_pdf(lines), "application/pdf"
+    if kind == "scanned_pdf":
+        return f"{stem}.pdf", scanned_pdf(lines), "application/pdf"
+    if kind == "docx":
+        return (f"{stem}.docx", docx_file(lines),
+                "application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+    if kind == "doc":
+        return f"{stem}.doc", html_doc(lines), "application/msword"
+    if kind == "image":
+        if rng.random() < 0.5:
+            return f"{stem}.png", image_file(lines, "PNG"), "image/png"
+        return f"{stem}.jpg", image_file(lines, "JPEG"), "image/jpeg"
+    raise ValueError(f"Unknown resume kind {kind!r}")
+
+
+def parse_mix(spec):
+    """"pdf=4,docx=3" -> {"pdf": 4, "docx": 3}"""
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def generate_corpus(count, mix=None, seed=1234):
+    """count resumes drawn from mix (kind -> weight), identical for the same seed"""
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=count)
+    return [make_resume(kind, index, rng) for index, kind in enumerate(kinds)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="directory to write the resumes to")
+    parser.add_argument("--count", type=int, default=50)
+    parser.add_argument("--mix", default="", help="kind=weight list; kinds: " + ", ".join(DEFAULT_MIX))
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+    os.makedirs(args.out, exist_ok=True)
+    for filename, content, _ in generate_corpus(args.count, parse_mix(args.mix), args.seed):
+        with open(os.path.join(args.out, filename), "wb") as f:
+            f.write(content)
+    print(f"Wrote {args.count} resumes to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+End-to-end throughput benchmark for POST /analyze-resumes/.
+
+Starts the API (uvicorn main:app) against the local fake OpenAI server
+and a throwaway MongoDB, then screens synthetic batches of increasing
+size. For each batch size it reports:
+- files/sec
+- p50/p95/p99 per processing stage, from the X-Debug-Timings breakdown
+- peak RSS of the API process
+
+MongoDB comes from BENCH_MONGODB_URI (must be a disposable instance: the
+benchmark writes to its resume_screening database) or, if unset, from a
+temporary `mongod` started on a free port.
+
+    python benchmarks/e2e_throughput.py --batch-sizes 1,10,50,200 --latency-ms 800 --rate-limit 0.02
+    python benchmarks/e2e_throughput.py --api-url http://127.0.0.1:8000 --api-pid 4242   # already running API
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import httpx
+
+from bench_utils import (
+    BENCHMARKS_DIR, free_port, peak_rss_mb, percentile, python_command,
+    reset_peak_rss, start_process, stop_process, wait_for_http
+)
+from corpus import generate_corpus, parse_mix
+
+JOB_DESCRIPTION = """Sales Executive - Mumbai
+Age: 22 - 35 years
+Education: Graduate (any stream), MBA preferred
+Skills: negotiation, lead generation, CRM, insurance products, MS Excel
+Responsibilities:
+- Own the full sales cycle for corporate insurance clients
+- Build and maintain a pipeline of key accounts
+- Coordinate with underwriting and claims teams"""
+
+STAGE_PERCENTILES = (50, 95, 99)
+
+
+def start_mongod(workdir):
+    """(process, uri) for a temporary mongod, or exit if none is installed"""
+    mongod = shutil.which("mongod")
+    if not mongod:
+        raise SystemExit("No mongod on PATH. Install MongoDB or set BENCH_MONGODB_URI to a disposable instance.")
+    port = free_port()
+    dbpath = os.path.join(workdir, "mongo")
+    os.makedirs(dbpath)
+    process = start_process(
+        [mongod, "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+        log_path=os.path.join(workdir, "mongod.log")
+    )
+    return process, f"mongodb://127.0.0.1:{port}"
+
+
+def start_stack(workdir, processes, latency_ms, jitter_ms, rate_limit, seed=None):
+    """
+    Start fake OpenAI, MongoDB (unless BENCH_MONGODB_URI is set) and the API,
+    appending each process to processes; returns (api_url, api_pid)
+    """
+    openai_port = free_port()
+    fake_openai = start_process(
+        python_command(os.path.join(BENCHMARKS_DIR, "fake_openai.py"),
+                       "--port", str(openai_port), "--latency-ms", str(latency_ms),
+                       "--jitter-ms", str(jitter_ms), "--rate-limit", str(rate_limit),
+                       *(["--seed", str(seed)] if seed is not None else [])),
+        log_path=os.path.join(workdir, "fake_openai.log")
+    )
+    processes.append(fake_openai)
+    mongodb_uri = os.getenv("BENCH_MONGODB_URI")
+    if not mongodb_uri:
+        mongod, mongodb_uri = start_mongod(workdir)
+        processes.append(mongod)
+    api_port = free_port()
+    api = start_process(
+        python_command("-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(api_port),
+                       "--log-level", "warning"),
+        env={
+            "MONGODB_URI": mongodb_uri,
+            "OPENAI_API_KEY": "sk-benchmark",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+            "LOG_LEVEL": "WARNING",
+            "RECRUITER_DAILY_BUDGET_USD": "0",
+        },
+        log_path=os.path.join(workdir, "api.log")
+    )
+    processes.append(api)
+    wait_for_http(f"http://127.0.0.1:{openai_port}/stats", process=fake_openai)
+    api_url = f"http://127.0.0.1:{api_port}"
+    wait_for_http(f"{api_url}/metrics", process=api)
+    return api_url, api.pid
+
+
+def authenticate(api, username="bench-e2e", password="bench-password"):
+    api.post("/backend/register", json={
+        "username": username, "email": f"{username}@example.com", "password": password
+    })
+    response = api.post("/backend/login", data={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def run_batch(api, token, files):
+    """(wall seconds, results) for one /analyze-resumes/ call"""
+    start = time.perf_counter()
+    response = api.post(
+        "/backend/analyze-resumes/",
+        headers={"Authorization": f"Bearer {token}", "X-Debug-Timings": "1"},
+        data={"job_description": JOB_DESCRIPTION, "hiring_type": "1", "level": "2"},
+        files=[("files", (name, content, content_type)) for name, content, content_type in files],
+    )
+    wall = time.perf_counter() - start
+    response.raise_for_status()
+    return wall, response.json()["results"]
+
+
+def stage_summary(results):
+    """stage -> {"n", "p50", "p95", "p99"} in ms, across the files of a batch"""
+    samples = {}
+    for result in results:
+        for stage, ms in (result.get("timings") or {}).items():
+            samples.setdefault(stage, []).append(ms)
+    return {
+        stage: {"n": len(values), **{f"p{pct}": percentile(values, pct) for pct in STAGE_PERCENTILES}}
+        for stage, values in sorted(samples.items())
+    }
+
+
+def print_report(runs):
+    print(f"\n{'batch':>6} {'wall s':>8} {'files/s':>8} {'errors':>7} {'peak RSS MB':>12}")
+    for run in runs:
+        rss = f"{run['peak_rss_mb']:.0f}" if run["peak_rss_mb"] is not None else "-"
+        print(f"{run['batch_size']:>6} {run['wall_seconds']:8.2f} {run['files_per_second']:8.2f} "
+              f"{run['errors']:>7} {rss:>12}")
+    for run in runs:
+        print(f"\nbatch of {run['batch_size']}: per-stage ms")
+        print(f"  {'stage':<28} {'n':>5} {'p50':>9} {'p95':>9} {'p99':>9}")
+        for stage, row in run["stages"].items():
+            print(f"  {stage:<28} {row['n']:>5} {row['p50']:9.1f} {row['p95']:9.1f} {row['p99']:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", default="1,10,50,100,200")
+    parser.add_argument("--repeat", type=int, default=1, help="batches per size")
+    parser.add_argument("--mix", default="", help="corpus mix, e.g. pdf=4,scanned_pdf=1,docx=3,doc=1,image=1")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="fake OpenAI latency")
+    parser.add_argument("--jitter-ms", type=float, default=200.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="share of OpenAI calls answered with 429")
+    parser.add_argument("--api-url", help="benchmark an already running API instead of starting one")
+    parser.add_argument("--api-pid", type=int, help="pid of --api-url's process, for RSS readings")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--keep-logs", action="store_true", help="keep the work directory with process logs")
+    args = parser.parse_args()
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+    mix = parse_mix(args.mix)
+
+    workdir = tempfile.mkdtemp(prefix="bench-e2e-")
+    processes = []
+    try:
+        if args.api_url:
+            api_url, api_pid = args.api_url.rstrip("/"), args.api_pid
+        else:
+            api_url, api_pid = start_stack(workdir, processes, args.latency_ms, args.jitter_ms,
+                                           args.rate_limit, args.seed)
+
+        runs = []
+        with httpx.Client(base_url=api_url, timeout=None) as client:
+            token = authenticate(client)
+            # Warm-up: first-use imports and connection setup shouldn't count
+            run_batch(client, token, generate_corpus(2, mix, seed=args.seed - 1))
+            for size in batch_sizes:
+                for repeat in range(args.repeat):
+                    # A fresh corpus per batch, so earlier batches can't be served from caches
+                    files = generate_corpus(size, mix, seed=args.seed + size * 1000 + repeat)
+                    if api_pid:
+                        reset_peak_rss(api_pid)
+                    wall, results = run_batch(client, token, files)
+                    runs.append({
+                        "batch_size": size,
+                        "wall_seconds": wall,
+                        "files_per_second": size / wall,
+                        "errors": sum(1 for result in results if result.get("error")),
+                        "peak_rss_mb": peak_rss_mb(api_pid) if api_pid else None,
+                        "stages": stage_summary(results),
+                    })
+                    print(f"batch of {size}: {wall:.2f}s, {size / wall:.2f} files/s")
+
+        print_report(runs)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"args": vars(args), "runs": runs}, f, indent=2)
+    finally:
+        for process in reversed(processes):
+            stop_process(process)
+        if args.keep_logs:
+            print(f"\nLogs kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Micro-benchmarks for the resume text extractors.
+
+Runs every registered extractor (main.EXTRACTORS) over a fixture corpus
+and records, per fixture:
+- median wall time over --repeat runs
+- peak traced allocation (tracemalloc) of one extra run
+- extracted character count and a hash of the text
+
+and compares them with the stored baseline (extractor_baselines.json).
+The run fails (exit 1) when a fixture gets slower or allocates more than
+the tolerance allows, or when its extracted text changes at all. After an
+intentional change, re-record with --update-baseline on the reference
+machine and commit the file. --outputs-only records just the output pins
+(chars and text hash), which hold on any machine; fixtures pinned that way
+are checked for output changes but not for time or memory.
+
+Fixtures are generated deterministically from corpus.py: single and
+two-column text PDFs, a scanned PDF, plain and table-heavy DOCX, Naukri
+HTML saved as .doc, an OLE2 .doc and PNG/JPEG scans. Real documents that
+can't be generated (e.g. Word 97-2003 files) can be dropped into
+fixtures/extractors/ and are picked up by file name. OCR paths call the
+local fake OpenAI server with zero latency, so only our own work is timed.
+Fixtures needing a missing external tool (FIXTURE_TOOLS) are skipped and
+listed rather than measured on an error path.
+
+    python benchmarks/extractor_bench.py --repeat 7
+    python benchmarks/extractor_bench.py --only doc --update-baseline
+    python benchmarks/extractor_bench.py --update-baseline --outputs-only
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench_utils import BACKEND_DIR, BENCHMARKS_DIR, free_port, python_command, start_process, stop_process, wait_for_http
+from corpus import docx_file, html_doc, image_file, ole_doc, resume_lines, scanned_pdf, table_docx, text_pdf
+from import_profile import IMPORT_ENV
+
+BASELINE_PATH = os.path.join(BENCHMARKS_DIR, "extractor_baselines.json")
+FIXTURES_DIR = os.path.join(BENCHMARKS_DIR, "fixtures", "extractors")
+# Fixtures whose extraction path shells out to a tool; skipped, with a note, where it is missing
+FIXTURE_TOOLS = {"pdf_scanned": "pdftoppm"}  # poppler, used by pdf2image for the OCR fallback
+
+
+def generated_fixtures(seed=43):
+    """[(name, suffix, content)] built from the synthetic corpus, identical for the same seed"""
+    rng = random.Random(seed)
+    short, long_, other = resume_lines(rng), resume_lines(rng) * 4, resume_lines(rng)
+    return [
+        ("pdf_text", ".pdf", text_pdf(short)),
+        ("pdf_text_multipage", ".pdf", text_pdf(long_)),
+        ("pdf_two_column", ".pdf", text_pdf(long_, columns=2)),
+        ("pdf_scanned", ".pdf", scanned_pdf(other)),
+        ("docx_paragraphs", ".docx", docx_file(short)),
+        ("docx_tables", ".docx", table_docx(other)),
+        ("doc_naukri_html", ".doc", html_doc(short)),
+        ("doc_ole_binary", ".doc", ole_doc(other)),
+        ("image_png", ".png", image_file(short, "PNG")),
+        ("image_jpeg", ".jpg", image_file(other, "JPEG")),
+    ]
+
+
+def curated_fixtures():
+    """[(name, suffix, content)] for real documents kept in fixtures/extractors/"""
+    if not os.path.isdir(FIXTURES_DIR):
+        return []
+    fixtures = []
+    for filename in sorted(os.listdir(FIXTURES_DIR)):
+        stem, suffix = os.path.splitext(filename)
+        if stem.startswith(".") or not suffix:
+            continue
+        with open(os.path.join(FIXTURES_DIR, filename), "rb") as f:
+            fixtures.append((f"curated_{stem}", suffix.lower(), f.read()))
+    return fixtures
+
+
+def measure(extractor, path, repeat):
+    """Timings, tracemalloc peak and output of extractor(path)"""
+    extractor(path)  # warm-up: lazy imports and first-call caches shouldn't count
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = extractor(path)
+        timings.append((time.perf_counter() - start) * 1000)
+    # Allocation tracing slows everything down, so it gets a run of its own
+    tracemalloc.start()
+    try:
+        extractor(path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    text = text or ""
+    return {
+        "extractor": extractor.__name__,
+        "median_ms": round(statistics.median(timings), 3),
+        "min_ms": round(min(timings), 3),
+        "peak_kib": round(peak / 1024, 1),
+        "chars": len(text),
+        "text_sha256": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        "error": text.startswith("❌"),
+    }
+
+
+def compare(name, result, baseline, time_tolerance, time_slack_ms, memory_tolerance):
+    """List of regression messages for one fixture"""
+    problems = []
+    if result["chars"] != baseline["chars"] or result["text_sha256"] != baseline["text_sha256"]:
+        problems.append(f"{name}: output changed ({baseline['chars']} -> {result['chars']} chars)")
+    if "median_ms" not in baseline:
+        return problems  # output pins only
+    time_limit = baseline["median_ms"] * (1 + time_tolerance) + time_slack_ms
+    if result["median_ms"] > time_limit:
+        problems.append(f"{name}: {result['median_ms']:.1f}ms > {time_limit:.1f}ms "
+                        f"(baseline {baseline['median_ms']:.1f}ms)")
+    memory_limit = baseline["peak_kib"] * (1 + memory_tolerance)
+    if result["peak_kib"] > memory_limit:
+        problems.append(f"{name}: peak {result['peak_kib']:.0f}KiB > {memory_limit:.0f}KiB "
+                        f"(baseline {baseline['peak_kib']:.0f}KiB)")
+    return problems
+
+
+def print_report(results, baselines):
+    print(f"\n{'fixture':<28} {'extractor':<26} {'median ms':>10} {'base ms':>9} {'peak KiB':>9} {'chars':>7}")
+    for name, result in results.items():
+        base = baselines.get(name)
+        base_ms = f"{base['median_ms']:.1f}" if base and "median_ms" in base else "-"
+        chars = f"{result['chars']}{'!' if result['error'] else ''}"
+        print(f"{name:<28} {result['extractor']:<26} {result['median_ms']:10.1f} {base_ms:>9} "
+              f"{result['peak_kib']:9.0f} {chars:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per fixture")
+    parser.add_argument("--only", default="", help="comma-separated substrings of fixture names to run")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="record this run as the new baseline")
+    parser.add_argument("--outputs-only", action="store_true",
+                        help="with --update-baseline, record only output pins, skipping fixtures that errored")
+    parser.add_argument("--time-tolerance", type=float, default=0.5, help="allowed relative slowdown")
+    parser.add_argument("--time-slack-ms", type=float, default=5.0, help="absolute slack for very fast fixtures")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25, help="allowed relative growth of peak")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    fixtures = generated_fixtures() + curated_fixtures()
+    if args.only:
+        wanted = args.only.split(",")
+        fixtures = [fixture for fixture in fixtures if any(part in fixture[0] for part in wanted)]
+    skipped = {name: FIXTURE_TOOLS[name] for name, _, _ in fixtures
+               if name in FIXTURE_TOOLS and shutil.which(FIXTURE_TOOLS[name]) is None}
+    for name, tool in skipped.items():
+        print(f"skipping {name}: {tool} is not installed")
+    fixtures = [fixture for fixture in fixtures if fixture[0] not in skipped]
+
+    workdir = tempfile.mkdtemp(prefix="bench-extractors-")
+    openai_port = free_port()
+    fake_openai = start_process(
+        python_command(os.path.join(BENCHMARKS_DIR, "fake_openai.py"),
+                       "--port", str(openai_port), "--latency-ms", "0", "--jitter-ms", "0"),
+        log_path=os.path.join(workdir, "fake_openai.log")
+    )
+    try:
+        wait_for_http(f"http://127.0.0.1:{openai_port}/stats", process=fake_openai)
+        os.environ.update({k: os.environ.get(k, v) for k, v in IMPORT_ENV.items()})
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{openai_port}/v1"
+        os.environ.setdefault("LOG_LEVEL", "ERROR")  # fallback warnings would repeat every run
+        sys.path.insert(0, BACKEND_DIR)
+        import main as api
+
+        results = {}
+        for name, suffix, content in fixtures:
+            extractor = api.EXTRACTORS.get(suffix)
+            if extractor is None:
+                print(f"skipping {name}: no extractor for {suffix}")
+                continue
+            path = os.path.join(workdir, name + suffix)
+            with open(path, "wb") as f:
+                f.write(content)
+            results[name] = measure(extractor, path, args.repeat)
+    finally:
+        stop_process(fake_openai)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)["fixtures"]
+    print_report(results, baselines)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "fixtures": results}, f, indent=2)
+
+    if args.update_baseline:
+        # --only refreshes just the selected fixtures and keeps the rest
+        if args.outputs_only:
+            # An error here usually means a missing tool (e.g. poppler), not the expected output
+            results = {
+                name: {**baselines.get(name, {}), "extractor": result["extractor"],
+                       "chars": result["chars"], "text_sha256": result["text_sha256"]}
+                for name, result in results.items() if not result["error"]
+            }
+        merged = {**baselines, **results}
+        with open(args.baseline, "w") as f:
+            json.dump({"python": sys.version.split()[0], "fixtures": dict(sorted(merged.items()))}, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline for {len(results)} fixtures written to {args.baseline}")
+        return
+
+    if not baselines:
+        raise SystemExit(f"No baseline at {args.baseline}; record one with --update-baseline")
+    problems, unbaselined = [], []
+    for name, result in results.items():
+        if name in baselines:
+            problems += compare(name, result, baselines[name],
+                                args.time_tolerance, args.time_slack_ms, args.memory_tolerance)
+        else:
+            unbaselined.append(name)
+    if unbaselined:
+        print(f"\nNo baseline yet for: {', '.join(unbaselined)}")
+    if problems:
+        print("\nREGRESSIONS")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("\nOK: no regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+Answers POST /v1/chat/completions the way the screening code expects:
+OCR requests (messages carrying an image_url) get resume-like text back,
+everything else gets a "Match %: NN% ... Decision: ..." verdict. Latency
+and rate limiting are configurable, so benchmarks can exercise the slow
+and throttled paths without spending real tokens.
+
+    python benchmarks/fake_openai.py --port 9100 --latency-ms 900 --jitter-ms 300 --rate-limit 0.05
+
+Point the API at it with OPENAI_BASE_URL=http://127.0.0.1:9100/v1.
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+OCR_TEXT = """Jordan Example
+Senior Sales Executive | Mumbai
+Experience: 6 years in B2B insurance sales, key account management and channel partnerships.
+Education: MBA (Marketing), B.Com
+Skills: negotiation, CRM, lead generation, MS Excel, team leadership"""
+
+
+def create_app(latency_ms=800.0, jitter_ms=200.0, rate_limit=0.0, retry_after_ms=200, seed=None):
+    """
+    latency_ms/jitter_ms: uniform delay per request; rate_limit: share of
+    requests answered with 429 and a retry-after-ms hint.
+    """
+    app = FastAPI()
+    rng = random.Random(seed)
+    stats = {"requests": 0, "rate_limited": 0, "ocr": 0, "screening": 0}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        delay = max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000
+        if rate_limit and rng.random() < rate_limit:
+            stats["rate_limited"] += 1
+            await asyncio.sleep(min(delay, 0.05))
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after-ms": str(retry_after_ms)},
+                content={"error": {
+                    "message": "Rate limit reached (injected by fake_openai)",
+                    "type": "requests",
+                    "code": "rate_limit_exceeded"
+                }}
+            )
+        await asyncio.sleep(delay)
+
+        messages = body.get("messages") or []
+        content = messages[-1].get("content") if messages else ""
+        is_ocr = isinstance(content, list) and any(part.get("type") == "image_url" for part in content)
+        if is_ocr:
+            stats["ocr"] += 1
+            text = OCR_TEXT
+            prompt_tokens = 1100  # roughly what a resume page image costs
+        else:
+            stats["screening"] += 1
+            prompt = content if isinstance(content, str) else str(content)
+            # Same prompt, same verdict: keeps runs comparable
+            score = 55 + int(hashlib.sha256(prompt.encode()).hexdigest(), 16) % 41
+            decision = "✅ Shortlist" if score >= 72 else "❌ Reject"
+            text = (
+                f"Match %: {score}%\n"
+                f"Pros:\n- Relevant experience\n- Skills overlap with the JD\n"
+                f"Cons:\n- Some requirements not evidenced\n"
+                f"Decision: {decision}\n"
+                f"Reason (if Rejected): {'-' if score >= 72 else 'Partial fit'}"
+            )
+            prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(text) // 4)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": 0}
+            }
+        }
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--jitter-ms", type=float, default=200.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after-ms", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    app = create_app(args.latency_ms, args.jitter_ms, args.rate_limit, args.retry_after_ms, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
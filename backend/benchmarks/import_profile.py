@@ -0,0 +1,57 @@
+"""
+Import-time profile of the API module.
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter and
+prints the modules with the largest cumulative import time, so it is easy
+to spot a heavy dependency that slipped back into module load.
+
+    python benchmarks/import_profile.py --top 25
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Enough configuration for main to import without a real deployment
+IMPORT_ENV = {
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "OPENAI_API_KEY": "sk-benchmark",
+}
+
+
+def profile_imports():
+    """[(cumulative_us, self_us, module)] for one cold import of main"""
+    env = {**os.environ, **{k: os.environ.get(k, v) for k, v in IMPORT_ENV.items()}}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"import main failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    rows = profile_imports()
+    total = next((cumulative for cumulative, _, name in rows if name.strip() == "main"), None)
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative, self_us, name in sorted(rows, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
+    if total is not None:
+        print(f"\nimport main: {total / 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Load test of the production traffic mix against the offline stand-ins.
+
+Starts the fake OpenAI server, MongoDB and the API exactly like
+e2e_throughput.py, runs the Locust scenarios in locustfile.py headless
+while ramping concurrent recruiters, then writes a per-route summary
+(request count, error rate, rps, p50/p95/p99) and checks it against the
+SLOs in slo_report.py. Keep the summaries to compare runs later:
+
+    python benchmarks/load_test.py --stages 60:5,180:20,300:50 --out before.json
+    python benchmarks/load_test.py --stages 60:5,180:20,300:50 --out after.json
+    python benchmarks/slo_report.py before.json after.json --max-regression 0.2
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_utils import BENCHMARKS_DIR, python_command, stop_process
+from e2e_throughput import start_stack
+from slo_report import SLOS, print_run, slo_breaches, summarize_locust_csv
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", help="seconds:users[:spawn_rate] list; defaults to locustfile.DEFAULT_STAGES")
+    parser.add_argument("--mix", default="", help="corpus mix of uploaded files")
+    parser.add_argument("--batch-sizes", default="1,3,5,10", help="files per upload, picked at random")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="fake OpenAI latency")
+    parser.add_argument("--jitter-ms", type=float, default=200.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="share of OpenAI calls answered with 429")
+    parser.add_argument("--api-url", help="load an already running API instead of starting one")
+    parser.add_argument("--name", help="run name in reports; defaults to --out's file name")
+    parser.add_argument("--out", default=f"load-{time.strftime('%Y%m%d-%H%M%S')}.json", help="run summary to write")
+    parser.add_argument("--keep-logs", action="store_true", help="keep the work directory with logs and Locust CSVs")
+    args = parser.parse_args()
+
+    started = time.strftime("%Y-%m-%dT%H:%M:%S")
+    workdir = tempfile.mkdtemp(prefix="bench-load-")
+    processes = []
+    try:
+        if args.api_url:
+            api_url = args.api_url.rstrip("/")
+        else:
+            api_url, _ = start_stack(workdir, processes, args.latency_ms, args.jitter_ms, args.rate_limit)
+        csv_prefix = os.path.join(workdir, "locust")
+        locust = subprocess.run(
+            python_command("-m", "locust", "-f", os.path.join(BENCHMARKS_DIR, "locustfile.py"),
+                           "--headless", "--host", api_url, "--csv", csv_prefix,
+                           "--only-summary", "--loglevel", "WARNING"),
+            cwd=BENCHMARKS_DIR,
+            env={**os.environ, "LOAD_MIX": args.mix, "LOAD_BATCH_SIZES": args.batch_sizes,
+                 **({"LOAD_STAGES": args.stages} if args.stages else {})}
+        )
+        # Locust exits 1 when any request failed; that is what the SLO check is for
+        if locust.returncode not in (0, 1):
+            raise SystemExit(f"locust exited with {locust.returncode}")
+
+        run = {
+            "name": args.name or os.path.splitext(os.path.basename(args.out))[0],
+            "started": started,
+            "args": vars(args),
+            "routes": summarize_locust_csv(f"{csv_prefix}_stats.csv"),
+        }
+        with open(args.out, "w") as f:
+            json.dump(run, f, indent=2)
+        print_run(run, SLOS)
+        print(f"\nSummary written to {args.out}")
+    finally:
+        for process in reversed(processes):
+            stop_process(process)
+        if args.keep_logs:
+            print(f"Logs kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    breaches = slo_breaches(run, SLOS)
+    if breaches:
+        print("\nSLO BREACHES")
+        for breach in breaches:
+            print(f"  {breach}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
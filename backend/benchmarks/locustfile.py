@@ -0,0 +1,123 @@
+"""
+Locust scenarios modelling the production traffic mix.
+
+Each simulated recruiter registers and logs in, then loops over the
+things recruiters do all day, weighted roughly like production:
+browsing /mis-summary and /history, opening /reports/{date}, previewing
+and viewing resumes, uploading a batch now and then, and logging in again.
+Parametrised routes are grouped under one name ("/backend/reports/[date]")
+so percentiles are per route, not per URL.
+
+The RecruiterRamp shape ramps concurrent recruiters in stages taken from
+LOAD_STAGES ("seconds:users[:spawn_rate],..."), each stage held until its
+end time. Normally started by load_test.py, which also brings up the
+offline stand-ins; to point it at a running API directly:
+
+    LOAD_STAGES=60:5,180:25,300:50 locust -f benchmarks/locustfile.py --headless --host http://127.0.0.1:8000
+"""
+import os
+import random
+import uuid
+from datetime import date, timedelta
+
+from locust import HttpUser, LoadTestShape, between, task
+
+from corpus import generate_corpus, parse_mix
+from e2e_throughput import JOB_DESCRIPTION
+
+DEFAULT_STAGES = "60:5,180:20,300:50"
+UPLOAD_BATCH_SIZES = [int(size) for size in os.getenv("LOAD_BATCH_SIZES", "1,3,5,10").split(",")]
+HIRING_TYPES = ["1", "2", "3", "4"]
+LEVELS = ["1", "2"]
+
+# Generated once per worker; every upload draws from the same pool
+FILE_POOL = generate_corpus(int(os.getenv("LOAD_CORPUS_SIZE", "40")), parse_mix(os.getenv("LOAD_MIX", "")),
+                            seed=int(os.getenv("LOAD_SEED", "1234")))
+
+
+def parse_stages(spec):
+    """"60:5,180:20:2" -> [(60, 5, 5.0), (180, 20, 2.0)]: (end seconds, users, spawn rate)"""
+    stages = []
+    for part in spec.split(","):
+        fields = part.split(":")
+        users = int(fields[1])
+        spawn_rate = float(fields[2]) if len(fields) > 2 else max(1.0, users / 10)
+        stages.append((int(fields[0]), users, spawn_rate))
+    return stages
+
+
+class RecruiterRamp(LoadTestShape):
+    """Step the number of concurrent recruiters up through LOAD_STAGES, then stop"""
+
+    stages = parse_stages(os.getenv("LOAD_STAGES", DEFAULT_STAGES))
+
+    def tick(self):
+        run_time = self.get_run_time()
+        for end, users, spawn_rate in self.stages:
+            if run_time < end:
+                return users, spawn_rate
+        return None
+
+
+class Recruiter(HttpUser):
+    wait_time = between(1, 5)
+
+    def on_start(self):
+        self.username = f"load-{uuid.uuid4().hex[:12]}"
+        self.password = "load-test-password"
+        self.file_ids = []
+        self.client.post("/backend/register", json={
+            "username": self.username, "email": f"{self.username}@example.com", "password": self.password
+        }, name="/backend/register")
+        self.login()
+
+    def login(self):
+        response = self.client.post("/backend/login", data={
+            "username": self.username, "password": self.password
+        }, name="/backend/login")
+        if response.ok:
+            self.client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+    @task(1)
+    def relogin(self):
+        self.login()
+
+    @task(2)
+    def upload_batch(self):
+        files = random.sample(FILE_POOL, min(len(FILE_POOL), random.choice(UPLOAD_BATCH_SIZES)))
+        self.client.post(
+            "/backend/analyze-resumes/",
+            data={
+                "job_description": JOB_DESCRIPTION,
+                "hiring_type": random.choice(HIRING_TYPES),
+                "level": random.choice(LEVELS)
+            },
+            files=[("files", (name, content, content_type)) for name, content, content_type in files],
+            name="/backend/analyze-resumes/"
+        )
+
+    @task(5)
+    def mis_summary(self):
+        self.client.get("/backend/mis-summary", name="/backend/mis-summary")
+
+    @task(4)
+    def history(self):
+        response = self.client.get("/backend/history", params={"limit": 50}, name="/backend/history")
+        if response.ok:
+            ids = [item["file_id"] for item in response.json()["items"] if item.get("file_id")]
+            if ids:
+                self.file_ids = ids
+
+    @task(4)
+    def reports(self):
+        day = random.choice(["today", "yesterday", (date.today() - timedelta(days=random.randint(2, 30))).isoformat()])
+        self.client.get(f"/backend/reports/{day}", name="/backend/reports/[date]")
+
+    @task(4)
+    def view_resume(self):
+        if not self.file_ids:
+            return
+        file_id = random.choice(self.file_ids)
+        self.client.get(f"/backend/resume-preview/{file_id}", name="/backend/resume-preview/[id]")
+        if random.random() < 0.3:
+            self.client.get(f"/backend/view-resume/{file_id}", name="/backend/view-resume/[id]")
@@ -0,0 +1,99 @@
+"""
+Login latency under concurrent load.
+
+Fires LOGINS logins at CONCURRENCY in parallel against a running API and
+reports p50/p99. While the logins run, a probe keeps hitting /metrics so
+you can see whether Argon2 work is stalling the event loop.
+
+    python benchmarks/login_latency.py --base-url http://localhost:8000 \
+        --username bench --password bench-password --logins 200 --concurrency 32
+
+The account is registered first if it doesn't exist yet.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from bench_utils import percentile
+
+
+def summary(name, samples):
+    if not samples:
+        return f"{name:<8} no samples"
+    return (
+        f"{name:<8} n={len(samples):<5} p50={percentile(samples, 50):7.1f}ms "
+        f"p99={percentile(samples, 99):7.1f}ms max={max(samples):7.1f}ms "
+        f"mean={statistics.fmean(samples):7.1f}ms"
+    )
+
+
+async def ensure_account(client, username, password):
+    response = await client.post("/backend/register", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": password,
+    })
+    if response.status_code not in (200, 400):
+        raise SystemExit(f"Registration failed: {response.status_code} {response.text}")
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        await ensure_account(client, args.username, args.password)
+
+        latencies = []
+        statuses = {}
+        remaining = iter(range(args.logins))
+
+        async def worker():
+            for _ in remaining:
+                start = time.perf_counter()
+                response = await client.post("/backend/login", data={
+                    "username": args.username,
+                    "password": args.password,
+                })
+                elapsed = (time.perf_counter() - start) * 1000
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+
+        probe_latencies = []
+        done = asyncio.Event()
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/metrics")
+                probe_latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(args.probe_interval)
+
+        probe_task = asyncio.create_task(probe())
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - wall_start
+        done.set()
+        await probe_task
+
+    print(f"{args.logins} logins at concurrency {args.concurrency} in {wall:.2f}s "
+          f"({args.logins / wall:.1f}/s), status codes {statuses}")
+    print(summary("login", latencies))
+    print(summary("probe", probe_latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--username", default="bench-login")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--probe-interval", type=float, default=0.05, help="seconds between /metrics probes")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+SLO report for load-test runs.
+
+Reads run summaries written by load_test.py (or a raw Locust --csv
+prefix), checks the newest run against per-route SLOs and prints how
+p95 latency and error rate moved across all the runs given, oldest first.
+Exits 1 when the newest run breaches an SLO, or when --max-regression is
+set and a route's p95 grew by more than that fraction since the first run.
+
+    python benchmarks/slo_report.py baseline.json candidate.json
+    python benchmarks/slo_report.py candidate.json --slos my_slos.json --max-regression 0.2
+    python benchmarks/slo_report.py /tmp/load/locust        # reads /tmp/load/locust_stats.csv
+
+The --slos file maps "METHOD route" to {"p95_ms": ..., "error_rate": ...};
+routes without an entry are held to DEFAULT_SLO.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+DEFAULT_SLO = {"p95_ms": 500, "error_rate": 0.01}
+SLOS = {
+    "POST /backend/register": {"p95_ms": 1000, "error_rate": 0.01},
+    "POST /backend/login": {"p95_ms": 800, "error_rate": 0.01},
+    "POST /backend/analyze-resumes/": {"p95_ms": 30000, "error_rate": 0.02},
+    "GET /backend/mis-summary": {"p95_ms": 300, "error_rate": 0.005},
+    "GET /backend/history": {"p95_ms": 300, "error_rate": 0.005},
+    "GET /backend/reports/[date]": {"p95_ms": 300, "error_rate": 0.005},
+    "GET /backend/resume-preview/[id]": {"p95_ms": 300, "error_rate": 0.005},
+    "GET /backend/view-resume/[id]": {"p95_ms": 1000, "error_rate": 0.005},
+}
+
+
+def summarize_locust_csv(stats_csv):
+    """route -> {"requests", "failures", "error_rate", "rps", "p50_ms", "p95_ms", "p99_ms", "max_ms"}"""
+    routes = {}
+    with open(stats_csv, newline="") as f:
+        for row in csv.DictReader(f):
+            if row["Name"] == "Aggregated":
+                continue
+            requests = int(row["Request Count"])
+            failures = int(row["Failure Count"])
+            routes[f"{row['Type']} {row['Name']}"] = {
+                "requests": requests,
+                "failures": failures,
+                "error_rate": failures / requests if requests else 0.0,
+                "rps": float(row["Requests/s"]),
+                "p50_ms": float(row["50%"]),
+                "p95_ms": float(row["95%"]),
+                "p99_ms": float(row["99%"]),
+                "max_ms": float(row["Max Response Time"]),
+            }
+    return routes
+
+
+def load_run(path):
+    """{"name", "routes"} from a load_test.py summary or a Locust --csv prefix"""
+    if path.endswith(".json"):
+        with open(path) as f:
+            return json.load(f)
+    return {"name": os.path.basename(path), "routes": summarize_locust_csv(f"{path}_stats.csv")}
+
+
+def slo_breaches(run, slos):
+    breaches = []
+    for route, stats in sorted(run["routes"].items()):
+        slo = slos.get(route, DEFAULT_SLO)
+        if stats["p95_ms"] > slo["p95_ms"]:
+            breaches.append(f"{route}: p95 {stats['p95_ms']:.0f}ms > {slo['p95_ms']}ms")
+        if stats["error_rate"] > slo["error_rate"]:
+            breaches.append(f"{route}: error rate {stats['error_rate']:.2%} > {slo['error_rate']:.2%}")
+    return breaches
+
+
+def regressions(first, last, max_regression):
+    found = []
+    for route, stats in sorted(last["routes"].items()):
+        before = first["routes"].get(route)
+        if before and before["p95_ms"] and stats["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+            found.append(f"{route}: p95 {before['p95_ms']:.0f}ms -> {stats['p95_ms']:.0f}ms")
+    return found
+
+
+def print_run(run, slos):
+    print(f"\n{run['name']}")
+    print(f"  {'route':<36} {'reqs':>7} {'err %':>7} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'SLO p95':>8}")
+    for route, stats in sorted(run["routes"].items()):
+        slo = slos.get(route, DEFAULT_SLO)
+        flag = " !" if stats["p95_ms"] > slo["p95_ms"] or stats["error_rate"] > slo["error_rate"] else ""
+        print(f"  {route:<36} {stats['requests']:>7} {stats['error_rate']:7.2%} {stats['rps']:7.2f} "
+              f"{stats['p50_ms']:8.0f} {stats['p95_ms']:8.0f} {stats['p99_ms']:8.0f} {slo['p95_ms']:>8}{flag}")
+
+
+def print_comparison(runs):
+    routes = sorted({route for run in runs for route in run["routes"]})
+    print("\np95 ms / error rate per run")
+    print(f"  {'route':<36} " + " ".join(f"{run['name'][:18]:>18}" for run in runs))
+    for route in routes:
+        cells = []
+        for run in runs:
+            stats = run["routes"].get(route)
+            cells.append(f"{stats['p95_ms']:8.0f} / {stats['error_rate']:6.2%}" if stats else "-")
+        print(f"  {route:<36} " + " ".join(f"{cell:>18}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("runs", nargs="+", help="run summaries (.json) or Locust --csv prefixes, oldest first")
+    parser.add_argument("--slos", help="JSON file overriding the built-in SLOs")
+    parser.add_argument("--max-regression", type=float, help="fail if a route's p95 grew by more than this fraction")
+    args = parser.parse_args()
+
+    slos = dict(SLOS)
+    if args.slos:
+        with open(args.slos) as f:
+            slos.update(json.load(f))
+    runs = [load_run(path) for path in args.runs]
+    print_run(runs[-1], slos)
+    if len(runs) > 1:
+        print_comparison(runs)
+
+    problems = slo_breaches(runs[-1], slos)
+    if args.max_regression is not None and len(runs) > 1:
+        problems += regressions(runs[0], runs[-1], args.max_regression)
+    if problems:
+        print("\nSLO BREACHES")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("\nOK: all routes within SLO")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Cold-start budget for the API process.
+
+Imports main in several fresh interpreters and fails (exit 1) when the
+median import time exceeds the budget, or when a module that should be
+lazily loaded is already imported at startup. Use it as a CI gate:
+
+    python benchmarks/startup_budget.py --budget 1.0 --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from import_profile import BACKEND_DIR, IMPORT_ENV
+
+# Loaded on first use or by warm_lazy_modules after the port is bound
+LAZY_MODULES = ["openai", "pdfplumber", "pdf2image", "docx", "docx2txt", "mammoth", "bs4", "PIL.Image"]
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+eager = [name for name in {lazy!r} if name in sys.modules]
+print(elapsed)
+print(",".join(eager))
+"""
+
+
+def measure_once():
+    env = {**os.environ, **{k: os.environ.get(k, v) for k, v in IMPORT_ENV.items()}}
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE.format(lazy=LAZY_MODULES)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"import main failed:\n{proc.stderr[-2000:]}")
+    lines = proc.stdout.splitlines()
+    eager = lines[1].split(",") if len(lines) > 1 else []
+    return float(lines[0]), [name for name in eager if name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_BUDGET_SECONDS", "1.0")),
+                        help="maximum median seconds for `import main`")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    timings = []
+    eager = set()
+    for _ in range(args.runs):
+        elapsed, eager_modules = measure_once()
+        timings.append(elapsed)
+        eager.update(eager_modules)
+
+    median = statistics.median(timings)
+    print(f"import main over {args.runs} runs: median {median:.3f}s, "
+          f"min {min(timings):.3f}s, max {max(timings):.3f}s (budget {args.budget:.3f}s)")
+
+    failed = False
+    if median > args.budget:
+        print(f"FAIL: cold start is {median - args.budget:.3f}s over budget. "
+              f"Run benchmarks/import_profile.py to see what got heavier.")
+        failed = True
+    if eager:
+        print(f"FAIL: lazily loaded modules imported at startup: {', '.join(sorted(eager))}")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
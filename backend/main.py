@@ -1,38 +1,117 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, status
-from fastapi.responses import JSONResponse, Response
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Depends, Query, Request, status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.requests import ClientDisconnect
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from pydantic import BaseModel, EmailStr,field_validator
-from typing import List
-import pdfplumber
+from pydantic import BaseModel, EmailStr, Field, field_validator
+from typing import List, Optional
 import tempfile
 import os
 import re
-from openai import OpenAI
 from dotenv import load_dotenv
 import motor.motor_asyncio
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import quote
 # from passlib.context import CryptContext
 import jwt
 import base64
 from io import BytesIO
-from pdf2image import convert_from_path
+from bson import Binary
 import secrets
-import smtplib
+import aiosmtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import logging
-import gridfs
+import json
+import uuid
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+import asyncio
 import hashlib
+import random
+import unicodedata
+import time
+from contextvars import ContextVar, copy_context
+from contextlib import aclosing, asynccontextmanager, contextmanager, ExitStack
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from collections import OrderedDict, deque
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError
+import importlib
+import sys
+import zipfile
+import traceback
+import mimetypes
+import xml.etree.ElementTree as ET
 # Load environment variables from .env file
 load_dotenv()
 
+# --- Lazy Imports ---
+class LazyModule:
+    """
+    Stand-in for a heavy dependency that imports it on first attribute access,
+    so the process can bind its port without paying for PDF, Word and OpenAI
+    libraries up front. warm_lazy_modules loads them all once startup is done.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            # The import system's per-module locks make this safe across threads
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+pdfplumber = LazyModule("pdfplumber")
+pdf2image = LazyModule("pdf2image")
+openai = LazyModule("openai")
+bs4 = LazyModule("bs4")
+docx2txt = LazyModule("docx2txt")
+mammoth = LazyModule("mammoth")
+python_docx = LazyModule("docx")
+Image = LazyModule("PIL.Image")
+LAZY_MODULES = [pdfplumber, pdf2image, openai, bs4, docx2txt, mammoth, python_docx, Image]
+
+def log_task_failure(task):
+    """Done callback: log a background task's exception instead of leaving it unretrieved"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed: {task.exception()!r}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup/shutdown hook for the API process"""
+    await ensure_indexes()
+    outbox_worker = asyncio.create_task(email_outbox_worker(), name="email-outbox")
+    outbox_worker.add_done_callback(log_task_failure)
+    watchdog = start_loop_watchdog() if LOOP_LAG_MONITOR else None
+    # Runs in a thread, so uvicorn goes on to bind the port without waiting for it.
+    # Held here because the loop keeps only weak references to tasks.
+    warmup = asyncio.create_task(asyncio.to_thread(warm_lazy_modules), name="warm-lazy-modules")
+    warmup.add_done_callback(log_task_failure)
+    yield
+    background = [outbox_worker, warmup]
+    if watchdog:
+        monitor, stop = watchdog
+        stop.set()
+        background.append(monitor)
+    for task in background:
+        task.cancel()
+    # Failures were already logged by log_task_failure
+    await asyncio.gather(*background, return_exceptions=True)
+    await close_smtp_client()
+
 main_app = FastAPI()
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.mount("/backend", main_app)
 app.add_middleware(
     CORSMiddleware,
@@ -45,6 +124,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Upload-Offset", "Upload-Length", "Location"],
 )
 
 
@@ -53,20 +133,71 @@ app.add_middleware(
 MONGODB_URI =os.getenv("MONGODB_URI")
 if not MONGODB_URI:
     raise ValueError("MONGODB_URI is not set in .env")
-logging.basicConfig(level=logging.INFO)
+# Request-scoped context carried into every log line and trace span
+request_id_var = ContextVar("request_id", default=None)
+file_hash_var = ContextVar("file_hash", default=None)
+
+_STANDARD_LOG_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line, keyed by request id and file hash"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.utcfromtimestamp(record.created).isoformat(timespec="milliseconds") + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": request_id_var.get(),
+            "file_hash": file_hash_var.get()
+        }
+        # Anything passed through extra={...}
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_LOG_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" or "text"
+_log_handler = logging.StreamHandler()
+if LOG_FORMAT == "json":
+    _log_handler.setFormatter(JsonLogFormatter())
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), handlers=[_log_handler])
 logger = logging.getLogger(__name__)
 mongo_client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URI)
 db = mongo_client["resume_screening"]
 mis_collection = db["mis"]
 recruiters_collection = db["recruiters"]
 reset_tokens_collection = db["reset_tokens"]  # New collection for reset tokens
+candidates_collection = db["candidates"]  # Extracted resume text for candidate search
+job_descriptions_collection = db["job_descriptions"]  # Preprocessed JDs keyed by hash
+llm_usage_collection = db["llm_usage"]  # Append-only ledger, one document per LLM call
+llm_usage_daily_collection = db["llm_usage_daily"]  # Per recruiter/day/model rollups of the ledger
+daily_rollups_collection = db["daily_rollups"]  # Screening counters per recruiter/day/hiring type/level
+screenings_collection = db["screenings"]  # One document per screened file; mis keeps the batch header
+resume_previews_collection = db["resume_previews"]  # Thumbnail and text snapshot per GridFS file id
+email_outbox_collection = db["email_outbox"]  # Outgoing emails, delivered by email_outbox_worker
+profiles_collection = db["profiles"]  # Sampling profiler captures; the folded stacks live in profiles_fs
+upload_sessions_collection = db["upload_sessions"]  # Resumable uploads in progress or finished
+fs_files_collection = db["fs.files"]  # Written directly only by resumable uploads
+fs_chunks_collection = db["fs.chunks"]
 fs = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db)
+profiles_fs = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db, bucket_name="profiles")
 # JWT setup
 SECRET_KEY ="supersecretkey"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 1 week
 RESET_TOKEN_EXPIRE_MINUTES = 30  # 30 minutes for reset tokens
 
+# Argon2 cost parameters. Changing them rehashes each password at its next login.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST_KIB = int(os.getenv("ARGON2_MEMORY_COST_KIB", "65536"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+# Hashing runs off the event loop on its own small pool; beyond the queue limit we shed load
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+
 # Email configuration
 SMTP_SERVER = os.getenv("SMTP_SERVER")
 SMTP_PORT = os.getenv("SMTP_PORT")
@@ -74,13 +205,673 @@ EMAIL_USERNAME=os.getenv("EMAIL_USERNAME")
 EMAIL_PASSWORD=os.getenv("EMAIL_PASSWORD")
 FROM_EMAIL=os.getenv("FROM_EMAIL")
 FROM_NAME=os.getenv("FROM_NAME")
+# Set to "false" for a plain local SMTP server, e.g. `python -m aiosmtpd -n -l localhost:8025`
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+SMTP_TIMEOUT_SECONDS = 30
+SMTP_IDLE_SECONDS = 60  # close the shared connection after this long without mail
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+EMAIL_RETRY_BASE_SECONDS = 5  # doubled after every failed attempt
+EMAIL_RETRY_MAX_SECONDS = 300
+EMAIL_POLL_SECONDS = 5  # picks up retries and mail queued by other processes
+EMAIL_LEASE_SECONDS = 120  # a claimed message is retried if its sender dies
+EMAIL_RETENTION_DAYS = 7
+
+# Candidate search
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_SNIPPET_CHARS = 240
+
+# Near-duplicate detection (MinHash over word shingles, banded LSH)
+MINHASH_PERMUTATIONS = 128
+MINHASH_BAND_ROWS = 4  # 32 bands of 4 rows: ~0.85 similarity is caught with >99% probability
+MINHASH_SHINGLE_WORDS = 5
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.85"))
+NEAR_DUPLICATE_MAX_CANDIDATES = 50
+
+# Job description preprocessing
+JD_CACHE_SIZE = 256
+
+# Resume previews, rendered at ingest so the viewer needn't fetch the original
+PREVIEW_THUMBNAIL_WIDTH = 320
+PREVIEW_TEXT_CHARS = 2000
+
+# Zip archives uploaded to /analyze-resumes/ are screened member by member
+ARCHIVE_MAX_MEMBERS = int(os.getenv("ARCHIVE_MAX_MEMBERS", "500"))
+ARCHIVE_MAX_MEMBER_BYTES = 20 * 1024 * 1024
+ARCHIVE_MAX_TOTAL_BYTES = int(os.getenv("ARCHIVE_MAX_TOTAL_MB", "500")) * 1024 * 1024
+ARCHIVE_MAX_COMPRESSION_RATIO = 100  # resumes are already compressed; more than this smells of a zip bomb
+
+# A batch whose worker hasn't checkpointed a file for this long may be resumed by a retry
+BATCH_LEASE_SECONDS = int(os.getenv("BATCH_LEASE_SECONDS", "600"))
+
+# Resumable uploads. Chunks must line up with GridFS chunks, so this matches the driver default.
+UPLOAD_CHUNK_BYTES = 255 * 1024
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_MB", "500")) * 1024 * 1024
+UPLOAD_SPOOL_MEMORY_BYTES = 16 * 1024 * 1024  # zip uploads bigger than this are spooled to disk
+UPLOAD_SESSION_MAX_AGE_HOURS = 48  # unfinished uploads idle this long are purged
+
+# Per-process cache of recruiter documents for authenticated requests
+RECRUITER_CACHE_SIZE = int(os.getenv("RECRUITER_CACHE_SIZE", "1024"))
+RECRUITER_CACHE_TTL_SECONDS = float(os.getenv("RECRUITER_CACHE_TTL_SECONDS", "60"))
+
+# LLM cost accounting. Prices are USD per 1M tokens.
+MODEL_PRICING = {
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+}
+# Default per-recruiter daily spend limit; 0 disables it. A recruiter document
+# can override it with its own "daily_budget_usd".
+RECRUITER_DAILY_BUDGET_USD = float(os.getenv("RECRUITER_DAILY_BUDGET_USD", "0"))
+
+# LLM call deadlines in seconds (the SDK default is 10 minutes per attempt). A deadline
+# covers the whole call: up to LLM_MAX_RETRIES retries of outage errors share it.
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_TIMEOUTS = {
+    "pdf_ocr": float(os.getenv("LLM_OCR_TIMEOUT_SECONDS", "60")),
+    "image_ocr": float(os.getenv("LLM_OCR_TIMEOUT_SECONDS", "60")),
+}
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+LLM_MIN_ATTEMPT_SECONDS = 2  # not worth retrying with less time than this left
+# After this many consecutive outage errors LLM calls fail fast for LLM_BREAKER_OPEN_SECONDS,
+# then a single probe call decides whether to close the breaker again
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+# Hedging: for single-file requests, send a second identical call when the first hasn't
+# answered within the recent p95 latency of that kind of call
+LLM_HEDGE_SINGLE_FILE = os.getenv("LLM_HEDGE_SINGLE_FILE", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "1"))
+LLM_HEDGE_MIN_SAMPLES = 20  # no hedging until this many latencies are known for a purpose
+LLM_HEDGE_WINDOW = 200  # latencies kept per purpose
+LLM_HEDGE_WORKERS = int(os.getenv("LLM_HEDGE_WORKERS", "16"))
+# Comma-separated usernames allowed to call the /admin endpoints
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()}
 
 # pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
 # Make sure to set OPENAI_API_KEY in your .env file
 OPENAI_API_KEY=os.getenv("OPENAI_API_KEY").strip()
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = None  # created on first use by get_openai_client()
+
+def get_openai_client():
+    global client
+    if client is None:
+        client = openai.OpenAI(api_key=OPENAI_API_KEY)
+    return client
+
+def warm_lazy_modules():
+    """Import every lazily loaded dependency ahead of the first request that needs it"""
+    start = time.perf_counter()
+    for module in LAZY_MODULES:
+        try:
+            module._load()
+        except ImportError as e:
+            logger.warning(f"Could not preload {module._name}: {e}")
+    get_openai_client()
+    logger.info(f"Preloaded heavy modules in {time.perf_counter() - start:.2f}s")
+
+# --- Metrics (Prometheus text format at /metrics) ---
+STAGE_SECONDS = Histogram(
+    "resume_stage_duration_seconds",
+    "Time spent in each resume processing stage",
+    ["stage", "format"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+LLM_CALL_SECONDS = Histogram(
+    "llm_call_duration_seconds",
+    "OpenAI chat call latency",
+    ["model", "purpose", "status"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens used by OpenAI calls", ["model", "kind"])
+RESUMES_PROCESSED = Counter("resumes_processed_total", "Resumes screened", ["format", "decision"])
+ERRORS = Counter("resume_errors_total", "Errors while handling requests and resumes", ["type"])
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"]
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+FILES_IN_FLIGHT = Gauge("resume_files_in_flight", "Resume files currently being processed")
+PASSWORD_HASH_JOBS = Gauge("password_hash_jobs", "Argon2 hash/verify jobs running or queued")
+EMAILS = Counter("emails_total", "Outbox delivery attempts by outcome (sent, retry, failed)", ["outcome"])
+RECRUITER_CACHE_LOOKUPS = Counter(
+    "recruiter_cache_lookups_total", "Recruiter cache lookups by result (hit, miss, coalesced)", ["result"]
+)
+LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop woke a sleeping task, i.e. time it spent blocked",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+LOOP_STALLS = Counter("event_loop_stalls_total", "Times the event loop was blocked beyond LOOP_LAG_THRESHOLD_SECONDS")
+LLM_BREAKER_STATE = Gauge("llm_circuit_breaker_state", "LLM circuit breaker state (0 closed, 1 half-open, 2 open)")
+LLM_BREAKER_TRANSITIONS = Counter(
+    "llm_circuit_breaker_transitions_total", "LLM circuit breaker state changes by new state", ["state"]
+)
+LLM_CALLS_REJECTED = Counter("llm_calls_rejected_total", "LLM calls failed fast by the open circuit breaker", ["purpose"])
+LLM_HEDGES = Counter(
+    "llm_hedged_calls_total",
+    "Hedged LLM calls by outcome (launched, hedge_won, primary_won, both_failed)",
+    ["purpose", "outcome"]
+)
+
+# --- Tracing ---
+# TRACE_EXPORTER: "none", "console" (JSON log lines), "file" (JSONL at TRACE_FILE)
+# or "otlp" (OpenTelemetry API; configure the SDK and exporter with opentelemetry-instrument)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+DEBUG_TIMINGS_HEADER = b"x-debug-timings"
+
+_current_span = ContextVar("current_span", default=None)
+_file_timings = ContextVar("file_timings", default=None)  # stage -> ms for the file being processed
+debug_timings_var = ContextVar("debug_timings", default=False)
+trace_logger = logging.getLogger("trace")
+_trace_file_lock = threading.Lock()
+
+_otel_tracer = None
+if TRACE_EXPORTER == "otlp":
+    try:
+        from opentelemetry import trace as otel_trace
+        _otel_tracer = otel_trace.get_tracer("prohire.backend")
+    except ImportError:
+        logger.warning("opentelemetry-api not installed; spans will only be recorded locally")
+
+def export_span(span):
+    """Write a finished span to the local exporter"""
+    if TRACE_EXPORTER == "console":
+        trace_logger.info(span["name"], extra={"span": span})
+    elif TRACE_EXPORTER == "file":
+        line = json.dumps(span, default=str, ensure_ascii=False)
+        with _trace_file_lock, open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+@contextmanager
+def trace_span(name, **attributes):
+    """
+    Record a span nested under the current one. The trace id is the request id,
+    so every span of a request can be pulled out of the logs together.
+    """
+    parent = _current_span.get()
+    span = {
+        "trace_id": request_id_var.get() or uuid.uuid4().hex,
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": parent["span_id"] if parent else None,
+        "name": name,
+        "start": datetime.utcnow().isoformat(timespec="microseconds") + "Z",
+        "status": "ok",
+        "attributes": {k: v for k, v in attributes.items() if v not in (None, "")}
+    }
+    if file_hash_var.get():
+        span["attributes"]["file_hash"] = file_hash_var.get()
+    token = _current_span.set(span)
+    start = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            if _otel_tracer is not None:
+                stack.enter_context(_otel_tracer.start_as_current_span(name, attributes=span["attributes"]))
+            yield span
+    except BaseException as e:
+        span["status"] = "error"
+        span["error"] = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        span["duration_ms"] = round(elapsed_ms, 2)
+        _current_span.reset(token)
+        timings = _file_timings.get()
+        if timings is not None:
+            timings[name] = round(timings.get(name, 0) + elapsed_ms, 2)
+        if TRACE_EXPORTER in ("console", "file"):
+            export_span(span)
+
+@contextmanager
+def stage_timer(stage, fmt="", **attributes):
+    """Observe the duration of a processing stage as a metric and a trace span"""
+    start = time.perf_counter()
+    try:
+        with trace_span(stage, format=fmt, **attributes):
+            yield
+    finally:
+        STAGE_SECONDS.labels(stage, fmt).observe(time.perf_counter() - start)
+
+class RequestContextMiddleware:
+    """
+    Plain ASGI middleware that assigns a request id (honouring X-Request-ID),
+    opens the root span and logs one structured line per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1").strip()[:64] or uuid.uuid4().hex
+        request_token = request_id_var.set(request_id)
+        debug_token = debug_timings_var.set(headers.get(DEBUG_TIMINGS_HEADER, b"").lower() in (b"1", b"true"))
+        task = asyncio.current_task()
+        with _loop_activity_lock:
+            _loop_activity[task] = {"request_id": request_id, "scope": scope}
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            with trace_span("http.request", method=scope["method"], path=scope["path"]) as span:
+                await self.app(scope, receive, send_wrapper)
+                span["attributes"]["status_code"] = status_code
+        finally:
+            route = scope.get("route")
+            logger.info("request completed", extra={
+                "method": scope["method"],
+                "route": getattr(route, "path", None) or scope["path"],
+                "status_code": status_code,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1)
+            })
+            with _loop_activity_lock:
+                activity = _loop_activity.pop(task, None)
+            if activity and "profile" in activity:
+                await finish_profiled_request(activity)
+            debug_timings_var.reset(debug_token)
+            request_id_var.reset(request_token)
+
+class MetricsMiddleware:
+    """Plain ASGI middleware: in-flight gauge and per-route latency histogram"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            ERRORS.labels(f"unhandled_{type(e).__name__}").inc()
+            raise
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # The router stores the matched route in the scope; fall back to a
+            # constant label so raw paths with ids never become label values
+            route = scope.get("route")
+            route_label = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route_label, str(status_code)).observe(
+                time.perf_counter() - start
+            )
+
+main_app.add_middleware(MetricsMiddleware)
+main_app.add_middleware(RequestContextMiddleware)
+
+# --- Event Loop Lag Watchdog ---
+# loop_lag_monitor sleeps in short steps and records how late it wakes up.
+# A watchdog thread notices when it is overdue, i.e. the loop is blocked
+# right now, and grabs the loop thread's stack while the blocking call is
+# still on it. Requests register their task in _loop_activity so the stall
+# can be pinned on a route and file.
+LOOP_LAG_MONITOR = os.getenv("LOOP_LAG_MONITOR", "true").lower() == "true"
+LOOP_LAG_SAMPLE_SECONDS = 0.1
+LOOP_LAG_THRESHOLD_SECONDS = float(os.getenv("LOOP_LAG_THRESHOLD_SECONDS", "0.25"))
+LOOP_STALL_STACK_FRAMES = 40
+
+_loop_activity = {}  # request task -> {"request_id", "scope", "file"}, read by the watchdog thread
+_loop_activity_lock = threading.Lock()  # guards _loop_activity and the dicts in it across threads
+_loop_heartbeat = {"at": time.monotonic(), "stall": None}
+
+def note_loop_activity(**details):
+    """Attach details (e.g. file=...) to the current request for stall reports"""
+    with _loop_activity_lock:
+        activity = _loop_activity.get(asyncio.current_task())
+        if activity is not None:
+            activity.update(details)
+
+def describe_loop_activity(activity):
+    scope = activity["scope"]
+    route = scope.get("route")
+    return {
+        "blocked_request_id": activity["request_id"],  # the log line's own request_id is the monitor's
+        "method": scope.get("method"),
+        "route": getattr(route, "path", None) or scope.get("path"),
+        "file": activity.get("file")
+    }
+
+def capture_loop_stall(loop, loop_thread_id):
+    """Stack of the loop thread and what it was serving, taken while it is blocked"""
+    frame = sys._current_frames().get(loop_thread_id)
+    stack = traceback.format_stack(frame)[-LOOP_STALL_STACK_FRAMES:] if frame else []
+    stall = {"stack": "".join(stack)}
+    task = asyncio.current_task(loop)
+    with _loop_activity_lock:
+        activity = _loop_activity.get(task)
+        activity = dict(activity) if activity is not None else None
+    if activity is not None:
+        stall.update(describe_loop_activity(activity))
+    elif task is not None:
+        stall["task"] = task.get_name()
+    return stall
+
+def loop_watchdog(loop, loop_thread_id, stop):
+    """Thread body: capture one stack per stall of the event loop"""
+    while not stop.wait(LOOP_LAG_SAMPLE_SECONDS / 2):
+        heartbeat = _loop_heartbeat["at"]
+        overdue = time.monotonic() - heartbeat - LOOP_LAG_SAMPLE_SECONDS
+        if overdue > LOOP_LAG_THRESHOLD_SECONDS and _loop_heartbeat["stall"] is None:
+            try:
+                _loop_heartbeat["stall"] = capture_loop_stall(loop, loop_thread_id)
+            except Exception as e:
+                logger.error(f"Loop watchdog failed to capture a stack: {e}")
+
+async def loop_lag_monitor():
+    """Record scheduling delay and log stalls with the stack the watchdog captured"""
+    while True:
+        _loop_heartbeat["at"] = time.monotonic()
+        start = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_SAMPLE_SECONDS)
+        lag = max(0.0, time.perf_counter() - start - LOOP_LAG_SAMPLE_SECONDS)
+        LOOP_LAG_SECONDS.observe(lag)
+        stall, _loop_heartbeat["stall"] = _loop_heartbeat["stall"], None
+        if lag > LOOP_LAG_THRESHOLD_SECONDS:
+            LOOP_STALLS.inc()
+            details = stall or {}
+            logger.warning(
+                f"Event loop blocked for {lag * 1000:.0f}ms"
+                + (f" in {details['method']} {details['route']}" if details.get("route") else "")
+                + (f" while processing {details['file']}" if details.get("file") else ""),
+                extra={"loop_lag_ms": round(lag * 1000, 1), **details}
+            )
+
+def start_loop_watchdog():
+    """(monitor task, stop event) for the running loop; the thread exits when stop is set"""
+    stop = threading.Event()
+    monitor = asyncio.create_task(loop_lag_monitor())
+    threading.Thread(
+        target=loop_watchdog, args=(asyncio.get_running_loop(), threading.get_ident(), stop),
+        name="loop-watchdog", daemon=True
+    ).start()
+    return monitor, stop
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# LLM calls made while this is set are appended to it, so the caller can
+# attribute them to a recruiter and file once the synchronous work is done.
+_llm_usage_records = ContextVar("llm_usage_records", default=None)
+
+def llm_call_cost(model, prompt_tokens, cached_tokens, completion_tokens):
+    """Cost of one call in USD"""
+    pricing = MODEL_PRICING.get(model)
+    if pricing is None:
+        logger.warning(f"No pricing configured for model {model}")
+        return 0.0
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return (
+        uncached * pricing["input"]
+        + cached_tokens * pricing["cached_input"]
+        + completion_tokens * pricing["output"]
+    ) / 1_000_000
+
+# --- LLM Circuit Breaker and Hedging ---
+class LLMUnavailableError(Exception):
+    """Raised instead of calling OpenAI while the circuit breaker is open"""
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+class CircuitBreaker:
+    """
+    closed: calls go through; failure_threshold consecutive failures open it.
+    open: calls fail fast for open_seconds, then the next call goes out as a
+    probe (half-open) while the others keep failing fast. The probe's
+    outcome closes the breaker or opens it again. Thread-safe: LLM calls run
+    on worker threads (asyncio.to_thread and the hedge pool).
+    """
+
+    def __init__(self, name, failure_threshold, open_seconds):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        self.state = state
+        LLM_BREAKER_STATE.set(BREAKER_STATES[state])
+        LLM_BREAKER_TRANSITIONS.labels(state).inc()
+        if state == "open":
+            logger.warning(f"{self.name} circuit breaker open after {self.failures} consecutive failures")
+        else:
+            logger.info(f"{self.name} circuit breaker {state.replace('_', '-')}")
+
+    def allow(self):
+        """Whether a call may go out now"""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.open_seconds:
+                self._set_state("half_open")
+            if self.state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return self.state == "closed"
+
+    def record_success(self):
+        with self._lock:
+            self.probing = False
+            if self.state != "closed":
+                self._set_state("closed")
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.probing = False
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._set_state("open")
+
+llm_breaker = CircuitBreaker("OpenAI", LLM_BREAKER_FAILURES, LLM_BREAKER_OPEN_SECONDS)
+
+def is_llm_outage(e):
+    """Errors that say the API is unhealthy (timeouts, connection errors, 429, 5xx), not that our request was bad"""
+    if isinstance(e, openai.APIConnectionError):  # includes APITimeoutError
+        return True
+    status_code = getattr(e, "status_code", None) or 0
+    return status_code == 429 or status_code >= 500
+
+# Set for latency-critical requests; their LLM calls are hedged when LLM_HEDGE_SINGLE_FILE is on
+_llm_hedge = ContextVar("llm_hedge", default=False)
+_llm_latencies = {}  # purpose -> recent successful call latencies in seconds
+_llm_latencies_lock = threading.Lock()
+llm_hedge_executor = ThreadPoolExecutor(max_workers=LLM_HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+
+def record_llm_latency(purpose, seconds):
+    with _llm_latencies_lock:
+        _llm_latencies.setdefault(purpose, deque(maxlen=LLM_HEDGE_WINDOW)).append(seconds)
+
+def hedge_delay(purpose):
+    """Seconds to wait before hedging a call: the recent p95, or None while there is too little data"""
+    with _llm_latencies_lock:
+        samples = sorted(_llm_latencies.get(purpose, ()))
+    if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    return max(samples[int(0.95 * (len(samples) - 1))], LLM_HEDGE_MIN_DELAY_SECONDS)
+
+def hedged_chat_completion(purpose, kwargs, deadline, delay):
+    """
+    Send the call and, if it hasn't answered within delay, an identical
+    second one under the same deadline; return whichever succeeds first.
+    Blocks, so callers run it on a worker thread. The SDK can't cancel the
+    loser, so it finishes in the background and its usage reaches the
+    ledger only if it completes before the file's usage is saved.
+    """
+    primary = llm_hedge_executor.submit(copy_context().run, chat_completion_until, purpose, kwargs, deadline)
+    done, _ = wait([primary], timeout=delay)
+    if done or llm_breaker.state != "closed":
+        return primary.result()
+    LLM_HEDGES.labels(purpose, "launched").inc()
+    hedge = llm_hedge_executor.submit(copy_context().run, chat_completion_until, purpose, kwargs, deadline)
+    pending = {primary, hedge}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                LLM_HEDGES.labels(purpose, "hedge_won" if future is hedge else "primary_won").inc()
+                return future.result()
+    LLM_HEDGES.labels(purpose, "both_failed").inc()
+    return primary.result()  # re-raises the primary's error
+
+def create_chat_completion(purpose, **kwargs):
+    """
+    Single entry point for OpenAI chat calls. Every call gets a deadline and
+    goes through the circuit breaker; calls of latency-critical requests are
+    hedged once their usual latency is known. Blocking: call it from a
+    worker thread, never on the event loop.
+    """
+    deadline = time.monotonic() + LLM_TIMEOUTS.get(purpose, LLM_TIMEOUT_SECONDS)
+    delay = hedge_delay(purpose) if LLM_HEDGE_SINGLE_FILE and _llm_hedge.get() else None
+    if delay is None:
+        return chat_completion_until(purpose, kwargs, deadline)
+    return hedged_chat_completion(purpose, kwargs, deadline, delay)
+
+def chat_completion_until(purpose, kwargs, deadline):
+    """
+    The call plus up to LLM_MAX_RETRIES retries of outage errors, each
+    attempt limited to the time left before deadline (time.monotonic()).
+    """
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            return chat_completion_attempt(purpose, kwargs, deadline - time.monotonic())
+        except Exception as e:
+            backoff = 0.5 * 2 ** attempt * random.uniform(0.8, 1.2)
+            if (attempt == LLM_MAX_RETRIES or not is_llm_outage(e)
+                    or deadline - time.monotonic() < backoff + LLM_MIN_ATTEMPT_SECONDS):
+                raise
+            logger.warning(f"LLM {purpose} call failed, retrying in {backoff:.1f}s: {e}")
+            time.sleep(backoff)
+
+def chat_completion_attempt(purpose, kwargs, timeout):
+    """
+    One OpenAI chat request under the circuit breaker, with the SDK's own
+    retries off. Records model, token usage, latency and cost of the call
+    for the usage ledger.
+    """
+    if not llm_breaker.allow():
+        LLM_CALLS_REJECTED.labels(purpose).inc()
+        raise LLMUnavailableError(
+            f"OpenAI is unavailable after repeated failures; retrying in up to {LLM_BREAKER_OPEN_SECONDS:g}s"
+        )
+    model = kwargs.get("model")
+    record = {"model": model, "purpose": purpose}
+    start = time.perf_counter()
+    try:
+        with trace_span(f"llm.{purpose}", model=model):
+            response = get_openai_client().with_options(
+                timeout=max(timeout, 0.1), max_retries=0
+            ).chat.completions.create(**kwargs)
+    except Exception as e:
+        record.update({"status": "error", "error": str(e)[:500]})
+        if is_llm_outage(e):
+            llm_breaker.record_failure()
+        else:
+            llm_breaker.record_success()  # the API answered; the request itself was bad
+        raise
+    else:
+        llm_breaker.record_success()
+        record_llm_latency(purpose, time.perf_counter() - start)
+        usage = getattr(response, "usage", None)
+        details = getattr(usage, "prompt_tokens_details", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+        cached_tokens = getattr(details, "cached_tokens", None) or 0
+        completion_tokens = getattr(usage, "completion_tokens", None) or 0
+        record.update({
+            "status": "ok",
+            "model": getattr(response, "model", None) or model,
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": getattr(usage, "total_tokens", None) or prompt_tokens + completion_tokens,
+            "cost_usd": llm_call_cost(model, prompt_tokens, cached_tokens, completion_tokens)
+        })
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        record["latency_ms"] = round(elapsed * 1000, 1)
+        LLM_CALL_SECONDS.labels(model, purpose, record["status"]).observe(elapsed)
+        if record["status"] == "ok":
+            LLM_TOKENS.labels(model, "prompt").inc(record["prompt_tokens"] - record["cached_tokens"])
+            LLM_TOKENS.labels(model, "cached_prompt").inc(record["cached_tokens"])
+            LLM_TOKENS.labels(model, "completion").inc(record["completion_tokens"])
+        else:
+            ERRORS.labels("llm_call").inc()
+        records = _llm_usage_records.get()
+        if records is not None:
+            records.append(record)
+
+# (collection, keys, options) for every index the API relies on
+INDEX_SPECS = [
+    (recruiters_collection, "username", {"unique": True}),
+    # Legacy form registrations have no email, so only real addresses must be unique
+    (recruiters_collection, "email", {"unique": True, "partialFilterExpression": {"email": {"$type": "string"}}}),
+    (reset_tokens_collection, "token", {"unique": True}),
+    # TTL: MongoDB removes each token once its expires_at has passed
+    (reset_tokens_collection, "expires_at", {"expireAfterSeconds": 0}),
+    (email_outbox_collection, [("status", 1), ("next_attempt_at", 1)], {}),
+    # Sent and failed mail holds reset links, so it is only kept for a while
+    (email_outbox_collection, "sent_at", {"expireAfterSeconds": EMAIL_RETENTION_DAYS * 86400}),
+    (email_outbox_collection, "failed_at", {"expireAfterSeconds": EMAIL_RETENTION_DAYS * 86400}),
+    (mis_collection, [("timestamp", -1)], {}),
+    (mis_collection, [("recruiter_name", 1), ("timestamp", -1)], {}),
+    (candidates_collection, [("text", "text"), ("resume_name", "text")], {
+        "name": "candidate_text_search",
+        "weights": {"resume_name": 5, "text": 1},
+        "default_language": "english"
+    }),
+    (candidates_collection, "text_hash", {"unique": True}),
+    (candidates_collection, "file_id", {}),
+    (candidates_collection, "lsh_bands", {}),
+    (daily_rollups_collection, [("recruiter_name", 1), ("date", 1), ("hiring_type", 1), ("level", 1)], {"unique": True}),
+    (daily_rollups_collection, "date", {}),
+    (screenings_collection, [("created_at", -1), ("_id", -1)], {}),
+    (screenings_collection, [("recruiter_name", 1), ("created_at", -1), ("_id", -1)], {}),
+    (screenings_collection, [("decision", 1), ("created_at", -1), ("_id", -1)], {}),
+    (screenings_collection, [("batch_id", 1), ("position", 1)], {"unique": True}),
+    (screenings_collection, "file_id", {}),
+    (profiles_collection, [("created_at", -1)], {}),
+    (mis_collection, [("recruiter_name", 1), ("idempotency_key", 1)],
+     {"unique": True, "partialFilterExpression": {"idempotency_key": {"$type": "string"}}}),
+    (upload_sessions_collection, [("status", 1), ("updated_at", 1)], {}),
+    (fs_chunks_collection, [("files_id", 1), ("n", 1)], {"unique": True}),  # what GridFS drivers create too
+]
+
+async def ensure_indexes():
+    """
+    Create the indexes the API relies on. Safe to run on every startup:
+    create_index is a no-op for an index that already exists, and one
+    failing index (e.g. duplicates blocking a unique index) doesn't stop the rest.
+    """
+    for collection, keys, options in INDEX_SPECS:
+        try:
+            await collection.create_index(keys, **options)
+        except Exception as e:
+            logger.error(f"Index creation failed on {collection.name} {keys}: {e}")
 
 # Pydantic models for request/response
 class ForgotPasswordRequest(BaseModel):
@@ -99,6 +890,17 @@ class ResetPasswordRequest(BaseModel):
             raise ValueError('Password is too long (max 128 characters)')
         return v
     
+class ProfileRequest(BaseModel):
+    route: Optional[str] = None  # e.g. "/analyze-resumes/"
+    recruiter: Optional[str] = None
+    requests: int = Field(5, ge=1, le=50)
+    interval_ms: float = Field(5, ge=1, le=100)
+
+class UploadSessionRequest(BaseModel):
+    filename: str
+    size: int = Field(..., ge=1)
+    content_type: Optional[str] = None
+
 class RecruiterRegistration(BaseModel):
     username: str
     password: str
@@ -121,33 +923,169 @@ class RecruiterRegistration(BaseModel):
         return v
     
 # --- Email Helper Functions ---
+# --- Email Outbox ---
+# Mail is queued in email_outbox and delivered by one worker task per process
+# over a single reused SMTP connection. Claims are atomic, so several API
+# processes can share the queue.
+_smtp_client = None
+_smtp_last_used = 0.0
+_outbox_wakeup = asyncio.Event()
+
+async def get_smtp_client():
+    """The shared SMTP connection, (re)connecting and logging in when needed"""
+    global _smtp_client
+    if _smtp_client is not None and _smtp_client.is_connected:
+        return _smtp_client
+    client = aiosmtplib.SMTP(
+        hostname=SMTP_SERVER,
+        port=int(SMTP_PORT) if SMTP_PORT else None,
+        start_tls=SMTP_STARTTLS,
+        timeout=SMTP_TIMEOUT_SECONDS
+    )
+    await client.connect()
+    if EMAIL_USERNAME and EMAIL_PASSWORD:
+        try:
+            await client.login(EMAIL_USERNAME, EMAIL_PASSWORD)
+        except Exception:
+            # Don't leak the connected socket on every retry of a bad login
+            try:
+                await client.quit()
+            except Exception:
+                client.close()
+            raise
+    _smtp_client = client
+    return client
+
+async def close_smtp_client():
+    global _smtp_client
+    client, _smtp_client = _smtp_client, None
+    if client is not None and client.is_connected:
+        try:
+            await client.quit()
+        except Exception:
+            client.close()
+
 async def send_email(to_email: str, subject: str, body: str, is_html: bool = False):
-    """Send email using SMTP"""
+    """Send one email over the shared SMTP connection. Raises on failure."""
+    global _smtp_last_used
+    msg = MIMEMultipart()
+    msg["From"] = f"{FROM_NAME} <{FROM_EMAIL}>"
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    
+    msg.attach(MIMEText(body, 'html' if is_html else 'plain'))
+    
+    for attempt in (1, 2):
+        client = await get_smtp_client()
+        try:
+            await client.send_message(msg, sender=FROM_EMAIL, recipients=[to_email])
+            _smtp_last_used = time.monotonic()
+            return
+        except aiosmtplib.SMTPServerDisconnected:
+            # The server dropped an idle connection; reconnect once straight away
+            await close_smtp_client()
+            if attempt == 2:
+                raise
+        except Exception:
+            await close_smtp_client()
+            raise
+
+async def enqueue_email(to_email: str, subject: str, body: str, is_html: bool = False, expires_at: datetime = None):
+    """
+    Queue an email for the outbox worker and return without waiting for SMTP.
+    Mail that can't be delivered before expires_at is given up on.
+    """
+    if not SMTP_SERVER:
+        raise HTTPException(
+            status_code=500, 
+            detail="Email configuration not set up properly"
+        )
+    now = datetime.utcnow()
+    await email_outbox_collection.insert_one({
+        "to": to_email,
+        "subject": subject,
+        "body": body,
+        "is_html": is_html,
+        "status": "pending",
+        "attempts": 0,
+        "created_at": now,
+        "next_attempt_at": now,
+        "expires_at": expires_at,
+        "request_id": request_id_var.get()
+    })
+    _outbox_wakeup.set()
+
+async def claim_outbox_message():
+    """Atomically take the next due message, including ones whose sender died mid-send"""
+    now = datetime.utcnow()
+    return await email_outbox_collection.find_one_and_update(
+        {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "locked_until": {"$lt": now}}
+        ]},
+        {
+            "$set": {"status": "sending", "locked_until": now + timedelta(seconds=EMAIL_LEASE_SECONDS)},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def deliver_outbox_message(message):
+    """Send a claimed message, then mark it sent or schedule a retry with backoff"""
+    attempts = message["attempts"]
     try:
-        if not EMAIL_USERNAME or not EMAIL_PASSWORD:
-            raise HTTPException(
-                status_code=500, 
-                detail="Email configuration not set up properly"
-            )
-        
-        msg = MIMEMultipart()
-        msg["From"] = f"{FROM_NAME} <{FROM_EMAIL}>"
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        msg.attach(MIMEText(body, 'html' if is_html else 'plain'))
-        
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
-        text = msg.as_string()
-        server.sendmail(FROM_EMAIL, to_email, text)
-        server.quit()
-        
-        return True
+        with trace_span("email.send", attempt=attempts, outbox_id=str(message["_id"])):
+            await send_email(message["to"], message["subject"], message["body"], message.get("is_html", False))
     except Exception as e:
-        print(f"Failed to send email: {e}")
-        return False
+        now = datetime.utcnow()
+        delay = min(EMAIL_RETRY_MAX_SECONDS, EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+        retry_at = now + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+        expires_at = message.get("expires_at")
+        give_up = attempts >= EMAIL_MAX_ATTEMPTS or (expires_at is not None and retry_at >= expires_at)
+        update = {"$set": {
+            "status": "failed" if give_up else "pending",
+            "next_attempt_at": retry_at,
+            "last_error": str(e)
+        }, "$unset": {"locked_until": ""}}
+        if give_up:
+            # The body may hold a reset link; it is never sent now, so don't keep it
+            update["$set"]["failed_at"] = now
+            update["$unset"]["body"] = ""
+        await email_outbox_collection.update_one({"_id": message["_id"]}, update)
+        EMAILS.labels("failed" if give_up else "retry").inc()
+        if give_up:
+            logger.error(f"Giving up on email to {message['to']} after {attempts} attempts: {e}")
+        else:
+            logger.warning(f"Email to {message['to']} failed (attempt {attempts}), retrying in {delay}s: {e}")
+        return
+    await email_outbox_collection.update_one(
+        {"_id": message["_id"]},
+        {"$set": {"status": "sent", "sent_at": datetime.utcnow()}, "$unset": {"locked_until": ""}}
+    )
+    EMAILS.labels("sent").inc()
+
+async def email_outbox_worker():
+    """Deliver queued mail until cancelled"""
+    while True:
+        _outbox_wakeup.clear()
+        try:
+            message = await claim_outbox_message()
+            if message is not None:
+                await deliver_outbox_message(message)
+                continue
+        except Exception as e:
+            # A message whose status update failed is redelivered once its lease expires
+            ERRORS.labels("email_outbox").inc()
+            logger.error(f"Email outbox iteration failed: {e}")
+            await asyncio.sleep(1)
+            continue
+        if _smtp_client is not None and time.monotonic() - _smtp_last_used > SMTP_IDLE_SECONDS:
+            await close_smtp_client()
+        try:
+            await asyncio.wait_for(_outbox_wakeup.wait(), EMAIL_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
 
 def generate_reset_token():
     """Generate a secure random token for password reset"""
@@ -156,7 +1094,8 @@ def generate_reset_token():
 def create_reset_token(email: str):
     """Create a JWT token for password reset"""
     expire = datetime.utcnow() + timedelta(minutes=RESET_TOKEN_EXPIRE_MINUTES)
-    to_encode = {"email": email, "exp": expire, "type": "reset"}
+    # jti keeps tokens issued within the same second distinct
+    to_encode = {"email": email, "exp": expire, "type": "reset", "jti": generate_reset_token()}
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def verify_reset_token(token: str):
@@ -169,7 +1108,35 @@ def verify_reset_token(token: str):
     except jwt.PyJWTError:
         return None
 
-ph = PasswordHasher()
+ph = PasswordHasher(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST_KIB,
+    parallelism=ARGON2_PARALLELISM
+)
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="argon2")
+_password_jobs = 0  # submitted to password_executor and not yet finished
+
+async def run_password_job(stage, fn, *args):
+    """
+    Run an Argon2 call on password_executor so it never blocks the event loop.
+    Rejects with 503 once the queue is full rather than letting logins pile up.
+    """
+    global _password_jobs
+    if _password_jobs >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_LIMIT:
+        ERRORS.labels("password_hash_overloaded").inc()
+        raise HTTPException(
+            status_code=503,
+            detail="Too many login attempts in progress, please retry",
+            headers={"Retry-After": "1"}
+        )
+    _password_jobs += 1
+    PASSWORD_HASH_JOBS.inc()
+    try:
+        with stage_timer(stage):
+            return await asyncio.get_running_loop().run_in_executor(password_executor, fn, *args)
+    finally:
+        _password_jobs -= 1
+        PASSWORD_HASH_JOBS.dec()
 
 # def verify_password(plain, hashed):
 #     """Verify password, handling long passwords the same way as hashing"""
@@ -179,11 +1146,13 @@ ph = PasswordHasher()
 #         plain = hashlib.sha256(password_bytes).hexdigest()
 #     return pwd_context.verify(plain, hashed)
 
-def verify_password(plain, hashed):
+async def verify_password(plain, hashed):
     """Verify password using Argon2 (no byte limit!)"""
     try:
-        ph.verify(hashed, plain)
+        await run_password_job("password_verify", ph.verify, hashed, plain)
         return True
+    except HTTPException:
+        raise
     except VerifyMismatchError:
         return False
     except Exception as e:
@@ -199,9 +1168,24 @@ def verify_password(plain, hashed):
 #         password = hashlib.sha256(password_bytes).hexdigest()
 #     return pwd_context.hash(password)
 
-def get_password_hash(password):
+async def get_password_hash(password):
     """Hash password using Argon2 (no 72-byte limit, more secure than bcrypt)"""
-    return ph.hash(password)
+    return await run_password_job("password_hash", ph.hash, password)
+
+async def rehash_password_if_needed(recruiter, password):
+    """Upgrade a stored hash made with older Argon2 parameters, after a successful login"""
+    try:
+        if not ph.check_needs_rehash(recruiter["hashed_password"]):
+            return
+        hashed = await get_password_hash(password)
+        # Only replace the hash we verified, in case the password changed meanwhile
+        await recruiters_collection.update_one(
+            {"_id": recruiter["_id"], "hashed_password": recruiter["hashed_password"]},
+            {"$set": {"hashed_password": hashed}}
+        )
+        invalidate_recruiter(recruiter["username"])
+    except Exception as e:
+        logger.error(f"Password rehash failed for {recruiter['username']}: {e}")
 
 async def get_recruiter(username: str):
     return await recruiters_collection.find_one({"username": username})
@@ -209,6 +1193,54 @@ async def get_recruiter(username: str):
 async def get_recruiter_by_email(email: str):
     return await recruiters_collection.find_one({"email": email})
 
+_recruiter_cache = OrderedDict()  # username -> (expires_at, recruiter doc), most recently used last
+_recruiter_loads = {}  # username -> in-flight lookup task shared by concurrent misses
+_recruiter_cache_stats = {"hit": 0, "miss": 0, "coalesced": 0}
+
+def count_recruiter_lookup(result):
+    _recruiter_cache_stats[result] += 1
+    RECRUITER_CACHE_LOOKUPS.labels(result).inc()
+
+async def load_recruiter(username: str):
+    """Query one recruiter and cache it, unless it was invalidated while in flight"""
+    task = asyncio.current_task()
+    try:
+        recruiter = await get_recruiter(username)
+        if recruiter is not None and _recruiter_loads.get(username) is task:
+            _recruiter_cache[username] = (time.monotonic() + RECRUITER_CACHE_TTL_SECONDS, recruiter)
+            _recruiter_cache.move_to_end(username)
+            if len(_recruiter_cache) > RECRUITER_CACHE_SIZE:
+                _recruiter_cache.popitem(last=False)
+        return recruiter
+    finally:
+        if _recruiter_loads.get(username) is task:
+            del _recruiter_loads[username]
+
+async def get_cached_recruiter(username: str):
+    """
+    get_recruiter behind a bounded LRU/TTL cache. Concurrent misses for the
+    same username wait on a single query instead of each hitting Mongo.
+    """
+    entry = _recruiter_cache.get(username)
+    if entry is not None and entry[0] > time.monotonic():
+        _recruiter_cache.move_to_end(username)
+        count_recruiter_lookup("hit")
+        return entry[1]
+    task = _recruiter_loads.get(username)
+    if task is None:
+        count_recruiter_lookup("miss")
+        task = asyncio.create_task(load_recruiter(username))
+        _recruiter_loads[username] = task
+    else:
+        count_recruiter_lookup("coalesced")
+    # Shielded so one cancelled request doesn't cancel the lookup for the others
+    return await asyncio.shield(task)
+
+def invalidate_recruiter(username: str):
+    """Drop a recruiter from the cache after its document changes"""
+    _recruiter_cache.pop(username, None)
+    _recruiter_loads.pop(username, None)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -228,9 +1260,15 @@ async def get_current_recruiter(token: str = Depends(oauth2_scheme)):
             raise credentials_exception
     except jwt.PyJWTError:
         raise credentials_exception
-    recruiter = await get_recruiter(username)
+    recruiter = await get_cached_recruiter(username)
     if recruiter is None:
         raise credentials_exception
+    note_loop_activity(recruiter=username)
+    return recruiter
+
+async def get_current_admin(recruiter=Depends(get_current_recruiter)):
+    if recruiter["username"] not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=403, detail="Admin access required")
     return recruiter
 
 @main_app.post("/register")
@@ -249,7 +1287,7 @@ async def register(recruiter_data: RecruiterRegistration):
         if existing_email:
             raise HTTPException(status_code=400, detail="Email already registered")
         
-        hashed = get_password_hash(recruiter_data.password)
+        hashed = await get_password_hash(recruiter_data.password)
         
         await recruiters_collection.insert_one({
             "username": username,
@@ -257,10 +1295,14 @@ async def register(recruiter_data: RecruiterRegistration):
             "hashed_password": hashed,
             "created_at": datetime.utcnow()
         })
+        invalidate_recruiter(username)
         
         return {"msg": "Recruiter registered successfully"}
     except HTTPException:
         raise
+    except DuplicateKeyError:
+        # Lost a race with a concurrent registration for the same username/email
+        raise HTTPException(status_code=400, detail="Username or email already registered")
     except ValueError as e:
         # Handle validation errors from pydantic validators
         raise HTTPException(status_code=400, detail=str(e))
@@ -276,12 +1318,16 @@ async def register_form(form: OAuth2PasswordRequestForm = Depends()):
     existing = await recruiters_collection.find_one({"username": username})
     if existing:
         raise HTTPException(status_code=400, detail="Username already registered")
-    hashed = get_password_hash(form.password)
-    await recruiters_collection.insert_one({
-        "username": form.username, 
-        "hashed_password": hashed,
-        "created_at": datetime.utcnow()
-    })
+    hashed = await get_password_hash(form.password)
+    try:
+        await recruiters_collection.insert_one({
+            "username": form.username, 
+            "hashed_password": hashed,
+            "created_at": datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Username already registered")
+    invalidate_recruiter(form.username)
     return {"msg": "Recruiter registered"}
 
 @main_app.post("/login")
@@ -293,8 +1339,9 @@ async def login(form: OAuth2PasswordRequestForm = Depends()):
         if not recruiter:
             raise HTTPException(status_code=400, detail="Incorrect username or password")
         
-        if not verify_password(form.password, recruiter["hashed_password"]):
+        if not await verify_password(form.password, recruiter["hashed_password"]):
             raise HTTPException(status_code=400, detail="Incorrect username or password")
+        await rehash_password_if_needed(recruiter, form.password)
         
         access_token = create_access_token(data={"sub": recruiter["username"]})
         return {
@@ -354,11 +1401,11 @@ async def forgot_password(request: ForgotPasswordRequest):
     </html>
     """
     
-    # Send email
-    email_sent = await send_email(email, subject, body, is_html=True)
-    
-    if not email_sent:
-        raise HTTPException(status_code=500, detail="Failed to send reset email")
+    # Queue email; the outbox worker delivers it with retries
+    await enqueue_email(
+        email, subject, body, is_html=True,
+        expires_at=datetime.utcnow() + timedelta(minutes=RESET_TOKEN_EXPIRE_MINUTES)
+    )
     
     return {"msg": "If the email exists, you will receive a password reset link"}
 
@@ -393,7 +1440,7 @@ async def reset_password(request: ResetPasswordRequest):
             raise HTTPException(status_code=404, detail="User not found")
         
         # Update password (using our fixed hash function)
-        hashed_password = get_password_hash(request.new_password)
+        hashed_password = await get_password_hash(request.new_password)
         
         await recruiters_collection.update_one(
             {"email": email},
@@ -404,6 +1451,7 @@ async def reset_password(request: ResetPasswordRequest):
                 }
             }
         )
+        invalidate_recruiter(recruiter["username"])
         
         # Mark token as used
         await reset_tokens_collection.update_one(
@@ -437,15 +1485,263 @@ async def verify_reset_token_endpoint(token: str):
     
     return {"valid": True, "email": email}
 
-# Cleanup expired tokens (call this periodically)
-@main_app.delete("/cleanup-expired-tokens")
-async def cleanup_expired_tokens():
-    """Remove expired reset tokens from database"""
-    result = await reset_tokens_collection.delete_many({
-        "expires_at": {"$lt": datetime.utcnow()}
-    })
-    return {"deleted_count": result.deleted_count}
+@main_app.get("/admin/cache-stats")
+async def cache_stats(admin=Depends(get_current_admin)):
+    """Recruiter cache size and hit rate since process start"""
+    lookups = sum(_recruiter_cache_stats.values())
+    return {
+        "recruiters": {
+            "size": len(_recruiter_cache),
+            "max_size": RECRUITER_CACHE_SIZE,
+            "ttl_seconds": RECRUITER_CACHE_TTL_SECONDS,
+            **_recruiter_cache_stats,
+            # Coalesced lookups were served without their own query
+            "hit_rate": round((lookups - _recruiter_cache_stats["miss"]) / lookups, 4) if lookups else None
+        }
+    }
+
+@main_app.get("/admin/index-stats")
+async def index_stats(admin=Depends(get_current_admin)):
+    """Per-index usage counters ($indexStats) for every collection with managed indexes"""
+    stats = {}
+    for collection in dict.fromkeys(spec[0] for spec in INDEX_SPECS):
+        try:
+            stats[collection.name] = [
+                {
+                    "name": row["name"],
+                    "key": row["key"],
+                    "ops": row["accesses"]["ops"],
+                    "since": row["accesses"]["since"].isoformat()
+                }
+                async for row in collection.aggregate([{"$indexStats": {}}])
+            ]
+        except Exception as e:
+            logger.error(f"Index stats failed for {collection.name}: {e}")
+            stats[collection.name] = {"error": str(e)}
+    return {"collections": stats}
+
+# --- Sampling Profiler ---
+# An admin arms a capture for the next N requests to a route and/or by a
+# recruiter. A sampler thread then records the stack of each matching
+# request every few milliseconds: the loop thread's frames while its task
+# runs, or its chain of awaited coroutines (ending in [awaiting]) while it
+# waits. The folded stacks ("frame;frame;frame count", the input format of
+# flamegraph.pl and speedscope) are stored in the profiles GridFS bucket.
+# Captures are armed in the process that received the request, so with
+# several workers arm one per worker or profile a single-worker instance.
+PROFILE_MAX_AGE_SECONDS = 3600  # a capture still waiting for requests after this is saved as expired
+
+_profile_captures = {}  # capture id -> capture still collecting samples
+_profile_lock = threading.Lock()  # guards _profile_captures between the sampler thread and the loop
+_profile_sampler = {"thread": None}
+
+def folded_frame_names(frames):
+    """Frames (outermost first) as flamegraph names, from the request middleware down"""
+    names = []
+    for frame in frames:
+        code = frame.f_code
+        if code is RequestContextMiddleware.__call__.__code__:
+            names = []  # drop the server and event-loop frames above it
+        names.append(f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+    return names
+
+def running_frames(thread_id):
+    frames = []
+    frame = sys._current_frames().get(thread_id)
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    return frames[::-1]
+
+def awaiting_frames(task):
+    """Frames of a suspended task's await chain, outermost first"""
+    frames = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return frames
+
+def profile_capture_for(activity):
+    """
+    The capture a request is sampled for, claiming a slot on its first match.
+    Call with _profile_lock and _loop_activity_lock held, in that order.
+    """
+    if "profile" in activity:
+        return _profile_captures.get(activity["profile"])
+    route = describe_loop_activity(activity)["route"]
+    for capture in _profile_captures.values():
+        if capture["claimed"] >= capture["requests"]:
+            continue
+        if capture["route"] and route != capture["route"]:
+            continue
+        if capture["recruiter"] and activity.get("recruiter") != capture["recruiter"]:
+            continue
+        capture["claimed"] += 1
+        activity["profile"] = capture["_id"]
+        return capture
+    return None
+
+def profile_sampler(loop, loop_thread_id):
+    """Thread body: sample matching requests until no capture is left"""
+    while True:
+        with _profile_lock:
+            if not _profile_captures:
+                _profile_sampler["thread"] = None
+                return
+            now = time.monotonic()
+            for capture in [c for c in _profile_captures.values() if now > c["deadline"]]:
+                del _profile_captures[capture["_id"]]
+                asyncio.run_coroutine_threadsafe(save_profile_capture(capture, "expired"), loop)
+            # Claim slots on the live entries, then work from copies so the loop thread
+            # isn't held up while stacks are walked
+            with _loop_activity_lock:
+                sampled = []
+                for task, activity in _loop_activity.items():
+                    capture = profile_capture_for(activity)
+                    if capture is not None:
+                        sampled.append((task, dict(activity), capture))
+            running = asyncio.current_task(loop)
+            for task, activity, capture in sampled:
+                if task is running:
+                    names = folded_frame_names(running_frames(loop_thread_id))
+                else:
+                    names = folded_frame_names(awaiting_frames(task)) + ["[awaiting]"]
+                details = describe_loop_activity(activity)
+                stack = ";".join([f"{details['method']} {details['route']}"] + names)
+                capture["stacks"][stack] = capture["stacks"].get(stack, 0) + 1
+                capture["samples"] += 1
+            interval = min(capture["interval_ms"] for capture in _profile_captures.values()) / 1000 \
+                if _profile_captures else 0
+        time.sleep(interval)
+
+async def save_profile_capture(capture, status):
+    """Upload the folded stacks and mark the capture finished"""
+    folded = "".join(
+        f"{stack} {count}\n" for stack, count in sorted(capture["stacks"].items(), key=lambda item: -item[1])
+    )
+    try:
+        file_id = await profiles_fs.upload_from_stream(
+            f"profile-{capture['_id']}.folded", folded.encode("utf-8"),
+            metadata={"profile_id": capture["_id"]}
+        )
+        await profiles_collection.update_one({"_id": capture["_id"]}, {"$set": {
+            "status": status,
+            "samples": capture["samples"],
+            "distinct_stacks": len(capture["stacks"]),
+            "profiled_requests": capture["profiled"],
+            "file_id": file_id,
+            "completed_at": datetime.utcnow()
+        }})
+    except Exception as e:
+        logger.error(f"Saving profile {capture['_id']} failed: {e}")
+
+async def finish_profiled_request(activity):
+    """Called as a sampled request ends; saves its capture once all N requests are done"""
+    with _profile_lock:
+        capture = _profile_captures.get(activity["profile"])
+        if capture is None:
+            return
+        details = describe_loop_activity(activity)
+        capture["profiled"].append({
+            "request_id": details["blocked_request_id"],
+            "method": details["method"],
+            "route": details["route"],
+            "recruiter": activity.get("recruiter")
+        })
+        if len(capture["profiled"]) < capture["requests"]:
+            return
+        del _profile_captures[capture["_id"]]
+    await save_profile_capture(capture, "complete")
+
+def profile_to_item(doc):
+    return {
+        "id": str(doc["_id"]),
+        "route": doc.get("route"),
+        "recruiter": doc.get("recruiter"),
+        "requests": doc["requests"],
+        "interval_ms": doc["interval_ms"],
+        "status": doc["status"],
+        "samples": doc.get("samples"),
+        "distinct_stacks": doc.get("distinct_stacks"),
+        "profiled_requests": doc.get("profiled_requests", []),
+        "created_by": doc.get("created_by"),
+        "created_at": doc["created_at"].isoformat(),
+        "completed_at": doc["completed_at"].isoformat() if doc.get("completed_at") else None,
+        "download": f"/admin/profiles/{doc['_id']}/download" if doc.get("file_id") else None
+    }
+
+@main_app.post("/admin/profiles")
+async def start_profile(profile: ProfileRequest, admin=Depends(get_current_admin)):
+    """Arm a sampling profile of the next N requests matching a route and/or recruiter"""
+    route = profile.route.strip() if profile.route else None
+    if route and route.startswith("/backend/"):
+        route = route[len("/backend"):]
+    recruiter = profile.recruiter.strip() if profile.recruiter else None
+    if not route and not recruiter:
+        raise HTTPException(status_code=400, detail="Give a route, a recruiter or both")
+    doc = {
+        "_id": ObjectId(),
+        "route": route,
+        "recruiter": recruiter,
+        "requests": profile.requests,
+        "interval_ms": profile.interval_ms,
+        "status": "armed",
+        "created_by": admin["username"],
+        "created_at": datetime.utcnow()
+    }
+    await profiles_collection.insert_one(doc)
+    with _profile_lock:
+        _profile_captures[doc["_id"]] = {
+            **doc,
+            "claimed": 0,
+            "profiled": [],
+            "samples": 0,
+            "stacks": {},
+            "deadline": time.monotonic() + PROFILE_MAX_AGE_SECONDS
+        }
+        if _profile_sampler["thread"] is None:
+            _profile_sampler["thread"] = threading.Thread(
+                target=profile_sampler, args=(asyncio.get_running_loop(), threading.get_ident()),
+                name="profile-sampler", daemon=True
+            )
+            _profile_sampler["thread"].start()
+    return profile_to_item(doc)
+
+@main_app.get("/admin/profiles")
+async def list_profiles(limit: int = Query(50, ge=1, le=200), admin=Depends(get_current_admin)):
+    """Past and armed captures, newest first"""
+    docs = await profiles_collection.find().sort("created_at", -1).limit(limit).to_list(length=limit)
+    return {"profiles": [profile_to_item(doc) for doc in docs]}
+
+@main_app.get("/admin/profiles/{profile_id}/download")
+async def download_profile(profile_id: str, admin=Depends(get_current_admin)):
+    """Folded stacks of a finished capture, ready for flamegraph.pl or speedscope"""
+    doc = await profiles_collection.find_one({"_id": parse_object_id(profile_id)})
+    if not doc or not doc.get("file_id"):
+        raise HTTPException(status_code=404, detail="Profile not found or not finished yet")
+    grid_out = await profiles_fs.open_download_stream(doc["file_id"])
+    return Response(
+        content=await grid_out.read(),
+        media_type="text/plain; charset=utf-8",
+        headers={"Content-Disposition": content_disposition("attachment", f"profile-{profile_id}.folded")}
+    )
+
+# --- Extractor Registry ---
+SUPPORTED_IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".webp"]
+EXTRACTORS = {}  # file suffix -> function(filepath) returning the extracted text
 
+def register_extractor(*suffixes):
+    def decorator(extractor):
+        for suffix in suffixes:
+            EXTRACTORS[suffix] = extractor
+        return extractor
+    return decorator
+
+@register_extractor(".pdf")
 def extract_text_from_pdf(filepath):
     with pdfplumber.open(filepath) as pdf:
         extracted_text = '\n'.join(
@@ -456,49 +1752,49 @@ def extract_text_from_pdf(filepath):
 
     # If no text was found using pdfplumber, fallback to OCR using OpenAI
     try:
-        images = convert_from_path(filepath)
+        images = pdf2image.convert_from_path(filepath)
         full_ocr_text = []
 
         for img in images:
-            buffered = BytesIO()
-            img.save(buffered, format="PNG")
-            img_base64 = base64.b64encode(buffered.getvalue()).decode()
-
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{img_base64}"
+            with stage_timer("ocr_page", ".pdf"):
+                buffered = BytesIO()
+                img.save(buffered, format="PNG")
+                img_base64 = base64.b64encode(buffered.getvalue()).decode()
+
+                response = create_chat_completion(
+                    "pdf_ocr",
+                    model="gpt-4o",
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": f"data:image/png;base64,{img_base64}"
+                                    }
+                                },
+                                {
+                                    "type": "text",
+                                    "text": "Please extract all readable text from this image of a resume."
                                 }
-                            },
-                            {
-                                "type": "text",
-                                "text": "Please extract all readable text from this image of a resume."
-                            }
-                        ]
-                    }
-                ],
-                temperature=0.3,
-                max_tokens=1500
-            )
+                            ]
+                        }
+                    ],
+                    temperature=0.3,
+                    max_tokens=1500
+                )
 
-            ocr_text = response.choices[0].message.content.strip()
-            if ocr_text:
-                full_ocr_text.append(ocr_text)
+                ocr_text = response.choices[0].message.content.strip()
+                if ocr_text:
+                    full_ocr_text.append(ocr_text)
 
         return "\n".join(full_ocr_text) if full_ocr_text else "❌ No text found in image using OCR."
 
     except Exception as e:
         return f"❌ Error during OCR fallback: {e}"
 
-from docx2pdf import convert as docx2pdf_convert
-import tempfile
-
+@register_extractor(".doc")
 def extract_text_from_doc(filepath: str) -> str:
     """
     Extract text from .doc files.
@@ -514,8 +1810,7 @@ def extract_text_from_doc(filepath: str) -> str:
         # Check if it's HTML content
         if any(tag in content.lower() for tag in ["<html", "<body", "<div", "<p>", "<table"]):
             try:
-                from bs4 import BeautifulSoup
-                soup = BeautifulSoup(content, "html.parser")
+                soup = bs4.BeautifulSoup(content, "html.parser")
                 
                 # Remove script and style elements
                 for script in soup(["script", "style"]):
@@ -535,38 +1830,35 @@ def extract_text_from_doc(filepath: str) -> str:
                 if result and len(result.strip()) > 10:  # Ensure we got meaningful content
                     return result.strip()
             except ImportError:
-                print("BeautifulSoup not available, trying alternative method")
+                logger.warning("BeautifulSoup not available, trying alternative method")
                 # Fallback: Basic HTML tag removal
-                import re
                 text = re.sub('<[^<]+?>', ' ', content)
                 text = re.sub(r'\s+', ' ', text).strip()
                 if len(text) > 10:
                     return text
     except Exception as e:
-        print(f"HTML extraction failed: {e}")
+        logger.warning(f"HTML extraction failed: {e}")
     
     # Method 2: Try as binary DOC file using python-docx2txt
     try:
-        import docx2txt
         text = docx2txt.process(filepath)
         if text and text.strip() and len(text.strip()) > 10:
             return text.strip()
     except ImportError:
-        print("docx2txt not available")
+        logger.warning("docx2txt not available")
     except Exception as e:
-        print(f"docx2txt extraction failed: {e}")
+        logger.warning(f"docx2txt extraction failed: {e}")
     
     # Method 3: Try with mammoth for binary DOC files
     try:
-        import mammoth
         with open(filepath, "rb") as doc_file:
             result = mammoth.extract_raw_text(doc_file)
             if result.value and result.value.strip() and len(result.value.strip()) > 10:
                 return result.value.strip()
     except ImportError:
-        print("mammoth not available")
+        logger.warning("mammoth not available")
     except Exception as e:
-        print(f"mammoth extraction failed: {e}")
+        logger.warning(f"mammoth extraction failed: {e}")
     
     # Method 4: Try reading as plain text with different encodings
     for encoding in ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']:
@@ -575,7 +1867,6 @@ def extract_text_from_doc(filepath: str) -> str:
                 content = f.read()
             
             # Basic cleanup
-            import re
             content = re.sub(r'[^\x20-\x7E\n\r\t]', ' ', content)  # Remove non-printable chars
             content = re.sub(r'\s+', ' ', content).strip()
             
@@ -586,6 +1877,7 @@ def extract_text_from_doc(filepath: str) -> str:
     
     return "❌ Unable to extract text from DOC file. Please convert to PDF or DOCX format."
 
+@register_extractor(".docx")
 def extract_text_from_docx(filepath: str) -> str:
     """
     Enhanced DOCX extractor for resumes.
@@ -595,8 +1887,7 @@ def extract_text_from_docx(filepath: str) -> str:
     
     # Method 1: python-docx (most comprehensive for structured content)
     try:
-        from docx import Document
-        doc = Document(filepath)
+        doc = python_docx.Document(filepath)
         
         # Extract paragraphs
         for para in doc.paragraphs:
@@ -632,16 +1923,15 @@ def extract_text_from_docx(filepath: str) -> str:
                     if text and text not in full_text:
                         full_text.append(text)
         
-        print(f"python-docx extracted {len(full_text)} text elements")
+        logger.debug(f"python-docx extracted {len(full_text)} text elements")
         
     except ImportError:
-        print("python-docx not available")
+        logger.warning("python-docx not available")
     except Exception as e:
-        print(f"python-docx extraction failed: {e}")
+        logger.warning(f"python-docx extraction failed: {e}")
     
     # Method 2: docx2txt (good for textboxes and complex layouts)
     try:
-        import docx2txt
         docx2txt_content = docx2txt.process(filepath)
         if docx2txt_content and docx2txt_content.strip():
             # Split into lines and add unique ones
@@ -652,17 +1942,14 @@ def extract_text_from_docx(filepath: str) -> str:
                     is_duplicate = any(line in existing for existing in full_text)
                     if not is_duplicate:
                         full_text.append(line)
-        print(f"docx2txt added additional content")
+        logger.debug("docx2txt added additional content")
     except ImportError:
-        print("docx2txt not available")
+        logger.warning("docx2txt not available")
     except Exception as e:
-        print(f"docx2txt extraction failed: {e}")
+        logger.warning(f"docx2txt extraction failed: {e}")
     
     # Method 3: python-docx-template (alternative approach)
     try:
-        import zipfile
-        import xml.etree.ElementTree as ET
-        
         with zipfile.ZipFile(filepath, 'r') as docx:
             # Extract document.xml
             if 'word/document.xml' in docx.namelist():
@@ -679,9 +1966,9 @@ def extract_text_from_docx(filepath: str) -> str:
                         if text and text not in full_text:
                             full_text.append(text)
         
-        print(f"XML extraction added additional content")
+        logger.debug("XML extraction added additional content")
     except Exception as e:
-        print(f"XML extraction failed: {e}")
+        logger.warning(f"XML extraction failed: {e}")
     
     # Combine and clean up
     if full_text:
@@ -697,7 +1984,6 @@ def extract_text_from_docx(filepath: str) -> str:
         final_text = "\n".join(unique_text)
         
         # Final cleanup
-        import re
         final_text = re.sub(r'\n\s*\n', '\n\n', final_text)  # Clean up multiple newlines
         final_text = re.sub(r'[ \t]+', ' ', final_text)       # Clean up multiple spaces/tabs
         
@@ -706,13 +1992,14 @@ def extract_text_from_docx(filepath: str) -> str:
     
     return "❌ Unable to extract text from DOCX file. Please ensure the file is not corrupted."
     
+@register_extractor(*SUPPORTED_IMAGE_EXTENSIONS)
 def extract_text_from_image(filepath: str) -> str:
     """
     Extract text from image files using OpenAI's Vision API (GPT-4 Vision).
     Supports common image formats like PNG, JPG, JPEG, etc.
     """
     try:
-        print(f"Starting OCR processing for file: {filepath}")  # Debug log
+        logger.debug(f"Starting OCR processing for file: {filepath}")
         
         # Check if file exists
         if not os.path.exists(filepath):
@@ -721,38 +2008,40 @@ def extract_text_from_image(filepath: str) -> str:
         # Read the image file
         with open(filepath, "rb") as image_file:
             image_data = image_file.read()
-            print(f"Image file size: {len(image_data)} bytes")  # Debug log
+            logger.debug(f"Image file size: {len(image_data)} bytes")
             
             # Encode to base64
             base64_image = base64.b64encode(image_data).decode('utf-8')
-            print(f"Base64 encoding completed, length: {len(base64_image)}")  # Debug log
+            logger.debug(f"Base64 encoding completed, length: {len(base64_image)}")
             
             # Use OpenAI's Vision API to extract text
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": "Please extract all the text from this image. Return only the extracted text without any additional formatting or explanations."
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
+            with stage_timer("ocr_page", "image"):
+                response = create_chat_completion(
+                    "image_ocr",
+                    model="gpt-4o",
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "text",
+                                    "text": "Please extract all the text from this image. Return only the extracted text without any additional formatting or explanations."
+                                },
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": f"data:image/jpeg;base64,{base64_image}"
+                                    }
                                 }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1000,
-                temperature=0.1
-            )
+                            ]
+                        }
+                    ],
+                    max_tokens=1000,
+                    temperature=0.1
+                )
             
             extracted_text = response.choices[0].message.content
-            print(f"OCR completed, extracted text length: {len(extracted_text) if extracted_text else 0}")  # Debug log
+            logger.debug(f"OCR completed, extracted text length: {len(extracted_text) if extracted_text else 0}")
             
             if extracted_text and extracted_text.strip():
                 return extracted_text.strip()
@@ -760,7 +2049,7 @@ def extract_text_from_image(filepath: str) -> str:
                 return "❌ Could not extract text from this image. Please ensure the image contains clear, readable text."
                 
     except Exception as e:
-        print(f"Error in OCR processing: {str(e)}")  # Debug log
+        logger.error(f"Error in OCR processing: {str(e)}")
         return f"❌ Error extracting text from image: {e}"
 
 
@@ -1024,7 +2313,8 @@ Reason (if Rejected): ...
         return {"error": "Invalid hiring or level choice provided.", "filename": ""}
 
     try:
-        response = client.chat.completions.create(
+        response = create_chat_completion(
+            "screening",
             model="gpt-4o",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.3,
@@ -1038,6 +2328,7 @@ Reason (if Rejected): ...
             result_text = "Match %: 0\nDecision: ❌ Reject\nReason (if Rejected): No response from model."
             
         usage = getattr(response, 'usage', None)
+        usage_details = getattr(usage, 'prompt_tokens_details', None)
 
         match_percent = 0
         match_line = re.search(r"Match\s*%:\s*(\d+)", result_text)
@@ -1056,13 +2347,14 @@ Reason (if Rejected): ...
             "match_percent": match_percent,
             "usage": {
                 "prompt_tokens": getattr(usage, 'prompt_tokens', None),
+                "cached_tokens": getattr(usage_details, 'cached_tokens', None),
                 "completion_tokens": getattr(usage, 'completion_tokens', None),
                 "total_tokens": getattr(usage, 'total_tokens', None)
             } if usage else None
         }
         
     except Exception as e:
-        print(f"Error in analyze_resume: {str(e)}")
+        logger.error(f"Error in analyze_resume: {str(e)}")
         return {"error": f"Analysis failed: {str(e)}", "filename": ""}
 
 def extract_candidate_name(resume_text, filename):
@@ -1086,171 +2378,1472 @@ def format_date_with_day(dt):
     formatted_date = dt.strftime(f"%d{suffix} %B %Y, %A")
     return formatted_date
 
-@main_app.post("/analyze-resumes/")
-async def analyze_resumes(
-    job_description: str = Form(...),
-    hiring_type: str = Form(...),
-    level: str = Form(...),
-    files: List[UploadFile] = File(...),
-    recruiter=Depends(get_current_recruiter)
-):
-    results = []
-    shortlisted = 0
-    rejected = 0
-    history = []
-    current_date = datetime.utcnow()
-    hiring_type_label = get_hiring_type_label(hiring_type)
-    level_label = get_level_label(level)
-    
+def is_extraction_error(text):
+    """Extractors return a '❌ ...' message instead of raising"""
+    return not text or text.startswith("❌")
+
+_MINHASH_PRIME = (1 << 61) - 1
+_MINHASH_MAX = (1 << 32) - 1
+# Fixed seed: stored signatures must stay comparable across restarts and deploys
+_minhash_rng = random.Random(20250825)
+MINHASH_COEFFICIENTS = [
+    (_minhash_rng.randrange(1, _MINHASH_PRIME), _minhash_rng.randrange(0, _MINHASH_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+def resume_shingles(text):
+    """Hashed word n-grams of the normalized text (layout and punctuation ignored)"""
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    if len(words) < MINHASH_SHINGLE_WORDS:
+        words = words + [""] * (MINHASH_SHINGLE_WORDS - len(words))
+    shingles = set()
+    for i in range(len(words) - MINHASH_SHINGLE_WORDS + 1):
+        shingle = " ".join(words[i:i + MINHASH_SHINGLE_WORDS]).encode("utf-8")
+        shingles.add(int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), "little"))
+    return shingles
+
+def compute_minhash(text):
+    """MinHash signature of the resume text"""
+    shingles = resume_shingles(text)
+    return [
+        min(((a * h + b) % _MINHASH_PRIME) & _MINHASH_MAX for h in shingles)
+        for a, b in MINHASH_COEFFICIENTS
+    ]
+
+def lsh_bands(signature):
+    """Band keys for the LSH index; two resumes collide if any band matches exactly"""
+    bands = []
+    for band, start in enumerate(range(0, len(signature), MINHASH_BAND_ROWS)):
+        rows = ",".join(str(v) for v in signature[start:start + MINHASH_BAND_ROWS])
+        bands.append(f"{band}:{hashlib.blake2b(rows.encode(), digest_size=8).hexdigest()}")
+    return bands
+
+def minhash_similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    if not sig_a or len(sig_a) != len(sig_b):
+        return 0.0
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+def verdict_key(jd_hash, hiring_type, level):
+    """Key under which a screening verdict is remembered for a resume"""
+    return hashlib.sha256(f"{hiring_type}:{level}:{jd_hash}".encode("utf-8")).hexdigest()
+
+async def find_near_duplicate(signature, bands, jd_key):
+    """
+    Find the closest previously seen resume whose signature shares an LSH band.
+    A match that already has a verdict for the same JD is preferred over a
+    slightly closer one without.
+    """
+    best = None
+    try:
+        cursor = candidates_collection.find(
+            {"lsh_bands": {"$in": bands}},
+            {"minhash": 1, "file_id": 1, "resume_name": 1, f"verdicts.{jd_key}": 1}
+        ).limit(NEAR_DUPLICATE_MAX_CANDIDATES)
+        async for doc in cursor:
+            similarity = minhash_similarity(signature, doc.get("minhash"))
+            if similarity < NEAR_DUPLICATE_THRESHOLD:
+                continue
+            verdict = (doc.get("verdicts") or {}).get(jd_key)
+            rank = (verdict is not None, similarity)
+            if best is None or rank > best["rank"]:
+                best = {
+                    "rank": rank,
+                    "file_id": str(doc["file_id"]) if doc.get("file_id") else None,
+                    "resume_name": doc.get("resume_name"),
+                    "similarity": round(similarity, 3),
+                    "verdict": verdict
+                }
+    except Exception as e:
+        logger.error(f"Near-duplicate lookup failed: {e}")
+    if best:
+        best.pop("rank")
+    return best
+
+async def remember_verdict(text_hash, jd_key, analysis, file_id, current_date):
+    """Store the screening verdict on the candidate so near-duplicates can reuse it"""
+    try:
+        await candidates_collection.update_one(
+            {"text_hash": text_hash},
+            {"$set": {f"verdicts.{jd_key}": {
+                "result_text": analysis.get("result_text"),
+                "match_percent": analysis.get("match_percent"),
+                "file_id": file_id,
+                "screened_at": current_date
+            }}}
+        )
+    except Exception as e:
+        logger.error(f"Failed to store verdict for {text_hash}: {e}")
+
+async def index_candidate_text(resume_text, filename, file_id, recruiter_name, hiring_type_label, level_label, current_date, signature=None):
+    """Persist extracted resume text so past candidates can be searched"""
+    text_hash = hashlib.sha256(resume_text.encode("utf-8")).hexdigest()
+    signature = signature or await asyncio.to_thread(compute_minhash, resume_text)
+    try:
+        # One document per distinct resume text; re-uploads refresh the pointers
+        await candidates_collection.update_one(
+            {"text_hash": text_hash},
+            {
+                "$set": {
+                    "text": resume_text,
+                    "resume_name": filename,
+                    "file_id": file_id,
+                    "recruiter_name": recruiter_name,
+                    "hiring_type": hiring_type_label,
+                    "level": level_label,
+                    "char_count": len(resume_text),
+                    "minhash": signature,
+                    "lsh_bands": lsh_bands(signature),
+                    "last_seen": current_date
+                },
+                "$setOnInsert": {"first_seen": current_date},
+                "$inc": {"uploads": 1}
+            },
+            upsert=True
+        )
+    except Exception as e:
+        logger.error(f"Failed to index candidate text for {filename}: {e}")
+    return text_hash
+
+def search_terms(query):
+    """Split a Mongo $text query into its phrases and positive keywords"""
+    phrases = re.findall(r'"([^"]+)"', query)
+    words = [w for w in re.sub(r'"[^"]*"', " ", query).split() if not w.startswith("-")]
+    return [t for t in phrases + words if t.strip()]
+
+def search_snippet(text, terms):
+    """Return a short window of text around the first matching term"""
+    lowered = text.lower()
+    positions = [lowered.find(t.lower()) for t in terms]
+    positions = [p for p in positions if p >= 0]
+    start = max(min(positions) - SEARCH_SNIPPET_CHARS // 3, 0) if positions else 0
+    snippet = re.sub(r"\s+", " ", text[start:start + SEARCH_SNIPPET_CHARS]).strip()
+    prefix = "..." if start > 0 else ""
+    suffix = "..." if start + SEARCH_SNIPPET_CHARS < len(text) else ""
+    return f"{prefix}{snippet}{suffix}"
+
+# --- Job Description Preprocessing ---
+_jd_cache = OrderedDict()  # jd_hash -> prepared JD, most recently used last
+
+JD_BULLET_RE = re.compile(r"^[\s\u2022\u25cf\u25aa\u25e6\u2023\u2043\u2219*\-–—>]+")
+JD_EDUCATION_RE = re.compile(
+    r"\b(10th|12th|HSC|SSC|graduate|graduation|post[- ]graduate|diploma|B\.?\s?E|B\.?\s?Tech|"
+    r"M\.?\s?E|M\.?\s?Tech|B\.?\s?Sc|M\.?\s?Sc|B\.?\s?Com|M\.?\s?Com|BBA|MBA|BCA|MCA|B\.?A|M\.?A|PhD)\b",
+    re.IGNORECASE
+)
+JD_AGE_RANGE_RE = re.compile(r"(\d{2})\s*(?:-|–|to)\s*(\d{2})\s*(?:years|yrs)", re.IGNORECASE)
+JD_AGE_MAX_RE = re.compile(
+    r"(?:up\s*to|upto|below|under|max(?:imum)?(?:\s+age)?(?:\s+of)?)\s*(\d{2})\s*(?:years|yrs)", re.IGNORECASE
+)
+JD_LOCATION_RE = re.compile(r"^(?:-\s*)?(?:job\s+|work\s+)?location\s*[:\-]\s*(.+)$", re.IGNORECASE | re.MULTILINE)
+JD_SKILLS_RE = re.compile(
+    r"^(?:-\s*)?(?:key\s+|required\s+|technical\s+)?skills?(?:\s+required)?\s*[:\-]\s*(.+)$", re.IGNORECASE | re.MULTILINE
+)
+
+def normalize_job_description(jd):
+    """
+    Canonical, compact form of a JD: unicode-normalized, bullets unified,
+    whitespace collapsed, blank lines and immediate repeats dropped. A line
+    repeated further on is kept, e.g. the same bullet under two roles.
+    """
+    text = unicodedata.normalize("NFKC", jd or "").replace("\r\n", "\n").replace("\r", "\n")
+    lines = []
+    for raw_line in text.split("\n"):
+        line = re.sub(r"[ \t\u00a0]+", " ", raw_line).strip()
+        if not line:
+            continue
+        if JD_BULLET_RE.match(line):
+            line = "- " + JD_BULLET_RE.sub("", line).strip()
+        if lines and lines[-1].lower() == line.lower():
+            continue
+        lines.append(line)
+    return "\n".join(lines)
+
+def extract_jd_criteria(text):
+    """Pull location, age band, education and required skills out of a normalized JD"""
+    criteria = {"location": None, "age": None, "education": [], "skills": []}
+
+    location = JD_LOCATION_RE.search(text)
+    if location:
+        criteria["location"] = location.group(1).strip(" .")
+
+    age_range = JD_AGE_RANGE_RE.search(text)
+    age_max = JD_AGE_MAX_RE.search(text)
+    if age_range:
+        criteria["age"] = {"min": int(age_range.group(1)), "max": int(age_range.group(2))}
+    elif age_max:
+        criteria["age"] = {"min": None, "max": int(age_max.group(1))}
+
+    for match in JD_EDUCATION_RE.finditer(text):
+        degree = match.group(1).strip()
+        if degree.lower() not in [e.lower() for e in criteria["education"]]:
+            criteria["education"].append(degree)
+
+    for match in JD_SKILLS_RE.finditer(text):
+        for skill in re.split(r"[,;/|]", match.group(1)):
+            skill = skill.strip(" .")
+            if skill and skill.lower() not in [s.lower() for s in criteria["skills"]]:
+                criteria["skills"].append(skill)
+
+    return criteria
+
+async def prepare_job_description(job_description):
+    """
+    Normalize, hash and parse a JD once, reusing earlier work for the same JD
+    from the in-process cache or the job_descriptions collection.
+    """
+    text = normalize_job_description(job_description)
+    jd_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    prepared = _jd_cache.get(jd_hash)
+    if prepared is not None:
+        _jd_cache.move_to_end(jd_hash)
+        return prepared
+
+    prepared = None
+    try:
+        doc = await job_descriptions_collection.find_one_and_update(
+            {"_id": jd_hash},
+            {"$set": {"last_used": datetime.utcnow()}, "$inc": {"uses": 1}},
+            projection={"text": 1, "criteria": 1}
+        )
+        if doc:
+            prepared = {"hash": jd_hash, "text": doc["text"], "criteria": doc["criteria"]}
+    except Exception as e:
+        logger.error(f"JD cache lookup failed: {e}")
+
+    if prepared is None:
+        prepared = {"hash": jd_hash, "text": text, "criteria": extract_jd_criteria(text)}
+        try:
+            await job_descriptions_collection.update_one(
+                {"_id": jd_hash},
+                {
+                    "$set": {"text": text, "criteria": prepared["criteria"], "last_used": datetime.utcnow()},
+                    "$setOnInsert": {"created_at": datetime.utcnow()},
+                    "$inc": {"uses": 1}
+                },
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Failed to store preprocessed JD: {e}")
+
+    _jd_cache[jd_hash] = prepared
+    if len(_jd_cache) > JD_CACHE_SIZE:
+        _jd_cache.popitem(last=False)
+    return prepared
+
+# --- LLM Usage Ledger ---
+def usage_day(dt):
+    """Rollup bucket (UTC calendar day) for a timestamp"""
+    return dt.strftime("%Y-%m-%d")
+
+async def get_daily_llm_spend(recruiter_name, day):
+    """Total LLM cost in USD already recorded for a recruiter on a UTC day"""
+    pipeline = [
+        {"$match": {"recruiter_name": recruiter_name, "date": day}},
+        {"$group": {"_id": None, "cost_usd": {"$sum": "$cost_usd"}}}
+    ]
+    async for row in llm_usage_daily_collection.aggregate(pipeline):
+        return row["cost_usd"]
+    return 0.0
+
+async def record_llm_usage(records, recruiter_name, filename, file_id, hiring_type_label, level_label, jd_hash, current_date):
+    """Append LLM calls to the ledger and fold them into the daily rollups. Returns their cost."""
+    if not records:
+        return 0.0
+    day = usage_day(current_date)
+    docs = []
+    for record in records:
+        docs.append({
+            **record,
+            "timestamp": datetime.utcnow(),
+            "date": day,
+            "recruiter_name": recruiter_name,
+            "resume_name": filename,
+            "file_id": file_id,
+            "hiring_type": hiring_type_label,
+            "level": level_label,
+            "jd_hash": jd_hash
+        })
+    try:
+        await llm_usage_collection.insert_many(docs, ordered=False)
+        for doc in docs:
+            await llm_usage_daily_collection.update_one(
+                {
+                    "recruiter_name": recruiter_name,
+                    "date": day,
+                    "model": doc.get("model"),
+                    "purpose": doc["purpose"],
+                    "hiring_type": hiring_type_label,
+                    "level": level_label
+                },
+                {"$inc": {
+                    "calls": 1,
+                    "errors": 1 if doc["status"] == "error" else 0,
+                    "prompt_tokens": doc.get("prompt_tokens", 0),
+                    "cached_tokens": doc.get("cached_tokens", 0),
+                    "completion_tokens": doc.get("completion_tokens", 0),
+                    "latency_ms": doc["latency_ms"],
+                    "cost_usd": doc.get("cost_usd", 0.0)
+                }},
+                upsert=True
+            )
+    except Exception as e:
+        logger.error(f"Failed to record LLM usage for {filename}: {e}")
+    return sum(doc.get("cost_usd", 0.0) for doc in docs)
+
+# --- Daily Rollups ---
+ROLLUP_KEY_FIELDS = ["recruiter_name", "date", "hiring_type", "level"]
+
+async def update_daily_rollup(recruiter_name, day, hiring_type_label, level_label, counts):
+    """Fold one batch's counters into its (recruiter, UTC day, hiring type, level) rollup"""
+    await daily_rollups_collection.update_one(
+        {"recruiter_name": recruiter_name, "date": day, "hiring_type": hiring_type_label, "level": level_label},
+        {"$inc": counts},
+        upsert=True
+    )
+
+async def backfill_daily_rollups():
+    """
+    Rebuild daily_rollups from the screenings collection. Each key is replaced
+    with the recomputed totals, so it is safe to run repeatedly; run it while no
+    batches are being screened, as a concurrent $inc on the same key can be
+    overwritten. Run migrate-screenings first if MIS history is still embedded.
+    """
+    await ensure_indexes()
+    pipeline = [
+        {
+            "$group": {
+                "_id": {
+                    "recruiter_name": "$recruiter_name",
+                    "date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                    "hiring_type": "$hiring_type",
+                    "level": "$level"
+                },
+                "batches": {"$addToSet": "$batch_id"},
+                "total_resumes": {"$sum": 1},
+                "shortlisted": {"$sum": {"$cond": [{"$eq": ["$decision", "Shortlisted"]}, 1, 0]}},
+                "rejected": {"$sum": {"$cond": [{"$eq": ["$decision", "Rejected"]}, 1, 0]}}
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "recruiter_name": "$_id.recruiter_name",
+                "date": "$_id.date",
+                "hiring_type": "$_id.hiring_type",
+                "level": "$_id.level",
+                "uploads": {"$size": "$batches"},
+                "total_resumes": 1,
+                "shortlisted": 1,
+                "rejected": 1,
+                "errors": {"$subtract": ["$total_resumes", {"$add": ["$shortlisted", "$rejected"]}]}
+            }
+        },
+        {
+            "$merge": {
+                "into": daily_rollups_collection.name,
+                "on": ROLLUP_KEY_FIELDS,
+                "whenMatched": "replace",
+                "whenNotMatched": "insert"
+            }
+        }
+    ]
+    async for _ in screenings_collection.aggregate(pipeline, allowDiskUse=True):
+        pass
+    count = await daily_rollups_collection.count_documents({})
+    logger.info(f"Daily rollups backfilled: {count} rollup documents")
+    return count
+
+MIGRATION_CHUNK_SIZE = 50  # batch documents per chunk; each may carry a large history array
+
+def parse_object_id(value):
+    try:
+        return ObjectId(value) if value else None
+    except Exception:
+        return None
+
+async def migrate_embedded_history(chunk_size=MIGRATION_CHUNK_SIZE, pause_seconds=0.1):
+    """
+    Move history arrays embedded in MIS batch documents into the screenings
+    collection, a chunk at a time, while the API keeps serving. Safe to
+    interrupt and rerun: screenings are upserted by (batch_id, position) and a
+    batch's array is only removed once all of its screenings are written.
+    """
+    await ensure_indexes()
+    batches = 0
+    screenings = 0
+    while True:
+        chunk = await mis_collection.find(
+            {"history": {"$exists": True}}
+        ).sort("_id", 1).limit(chunk_size).to_list(chunk_size)
+        if not chunk:
+            break
+        for doc in chunk:
+            ops = []
+            for position, item in enumerate(doc.get("history") or []):
+                ops.append(UpdateOne(
+                    {"batch_id": doc["_id"], "position": position},
+                    {"$setOnInsert": {
+                        "batch_id": doc["_id"],
+                        "position": position,
+                        "recruiter_name": doc.get("recruiter_name"),
+                        "resume_name": item.get("resume_name"),
+                        "hiring_type": item.get("hiring_type"),
+                        "level": item.get("level"),
+                        "match_percent": item.get("match_percent"),
+                        "decision": item.get("decision"),
+                        "details": item.get("details"),
+                        "file_id": parse_object_id(item.get("file_id")),
+                        "near_duplicate_of": parse_object_id(item.get("near_duplicate_of")),
+                        "jd_hash": doc.get("jd_hash"),
+                        "created_at": doc["timestamp"]
+                    }},
+                    upsert=True
+                ))
+            if ops:
+                await screenings_collection.bulk_write(ops, ordered=False)
+            await mis_collection.update_one({"_id": doc["_id"]}, {"$unset": {"history": ""}})
+            batches += 1
+            screenings += len(ops)
+        logger.info(f"Migrated {batches} batches, {screenings} screenings so far")
+        # Leave room for live traffic between chunks
+        await asyncio.sleep(pause_seconds)
+    logger.info(f"History migration complete: {batches} batches, {screenings} screenings")
+    return screenings
+
+def screening_document(batch, filename, file_id, decision, details, match_percent=None, near_duplicate_of=None):
+    """The screenings collection entry for one file of a batch"""
+    return {
+        "batch_id": batch["batch_id"],
+        "recruiter_name": batch["recruiter_name"],
+        "resume_name": filename,
+        "hiring_type": batch["hiring_type_label"],
+        "level": batch["level_label"],
+        "match_percent": match_percent,
+        "decision": decision,
+        "details": details,
+        "file_id": file_id,
+        "near_duplicate_of": ObjectId(near_duplicate_of) if near_duplicate_of else None,
+        "jd_hash": batch["jd"]["hash"],
+        "created_at": batch["current_date"]
+    }
+
+def screening_to_history_item(doc):
+    """API shape of a screening, as the MIS history table expects it"""
+    return {
+        "resume_name": doc.get("resume_name"),
+        "hiring_type": doc.get("hiring_type"),
+        "level": doc.get("level"),
+        "match_percent": doc.get("match_percent"),
+        "decision": doc.get("decision"),
+        "details": doc.get("details"),
+        "upload_date": format_date_with_day(doc["created_at"]),
+        "file_id": str(doc["file_id"]) if doc.get("file_id") else None,
+        "near_duplicate_of": str(doc["near_duplicate_of"]) if doc.get("near_duplicate_of") else None,
+        "recruiter_name": doc.get("recruiter_name"),
+        "timestamp": doc["created_at"].isoformat()
+    }
+
+def extract_resume_text(suffix, tmp_path):
+    """Run the extractor for a file type; None if the type is not supported"""
+    extractor = EXTRACTORS.get(suffix)
+    return extractor(tmp_path) if extractor else None
+
+# --- Resume Previews ---
+def render_resume_thumbnail(suffix, path):
+    """Small JPEG of a PDF's first page or of an image; None for other types or on failure"""
+    try:
+        if suffix == ".pdf":
+            pages = pdf2image.convert_from_path(path, first_page=1, last_page=1, size=(PREVIEW_THUMBNAIL_WIDTH, None))
+            if not pages:
+                return None
+            image = pages[0]
+        elif suffix in SUPPORTED_IMAGE_EXTENSIONS:
+            image = Image.open(path)
+        else:
+            return None
+        image = image.convert("RGB")
+        image.thumbnail((PREVIEW_THUMBNAIL_WIDTH, PREVIEW_THUMBNAIL_WIDTH * 2))
+        buffered = BytesIO()
+        image.save(buffered, format="JPEG", quality=70, optimize=True)
+        return buffered.getvalue()
+    except Exception as e:
+        logger.warning(f"Thumbnail rendering failed for {path}: {e}")
+        return None
+
+def preview_text_snapshot(text):
+    if not text or is_extraction_error(text):
+        return None
+    return re.sub(r"\n{3,}", "\n\n", text.strip())[:PREVIEW_TEXT_CHARS]
+
+async def store_resume_preview(file_id, filename, content_type, size, thumbnail, text):
+    """Save a file's preview; an existing preview for the id is kept"""
+    await resume_previews_collection.update_one(
+        {"_id": file_id},
+        {"$setOnInsert": {
+            "filename": filename,
+            "content_type": content_type,
+            "size": size,
+            "thumbnail": Binary(thumbnail) if thumbnail else None,
+            "text": preview_text_snapshot(text),
+            "text_truncated": bool(text) and len(text.strip()) > PREVIEW_TEXT_CHARS,
+            "created_at": datetime.utcnow()
+        }},
+        upsert=True
+    )
+    return await resume_previews_collection.find_one({"_id": file_id})
+
+async def build_resume_preview(file_id):
+    """
+    Preview for a file stored before previews existed: render the thumbnail
+    from GridFS and reuse the indexed text rather than re-running extraction.
+    """
+    try:
+        grid_out = await fs.open_download_stream(file_id)
+    except Exception:
+        raise HTTPException(status_code=404, detail="File not found")
+    suffix = os.path.splitext(grid_out.filename or "")[1].lower()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        async for chunk in iter_grid_out(grid_out, 0, grid_out.length):
+            tmp.write(chunk)
+        tmp_path = tmp.name
+    try:
+        with stage_timer("thumbnail", suffix):
+            thumbnail = await asyncio.to_thread(render_resume_thumbnail, suffix, tmp_path)
+    finally:
+        os.unlink(tmp_path)
+    candidate = await candidates_collection.find_one({"file_id": file_id}, {"text": 1})
+    return await store_resume_preview(
+        file_id, grid_out.filename, (grid_out.metadata or {}).get("content_type", "application/octet-stream"),
+        grid_out.length, thumbnail, candidate["text"] if candidate else None
+    )
+
+# --- Zip Archive Uploads ---
+class ArchiveMember:
+    """One zip member, with the parts of UploadFile that screen_resume_file uses"""
+
+    def __init__(self, filename, content):
+        self.filename = filename
+        self.content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        self._content = content
+
+    async def read(self):
+        content, self._content = self._content, b""
+        return content
+
+def archive_member_error(info):
+    """Why a member is refused, judged from its header alone; None if it may be read"""
+    if info.flag_bits & 0x1:
+        return "Encrypted archive members are not supported"
+    if os.path.splitext(info.filename)[1].lower() == ".zip":
+        return "Archives inside archives are not supported"
+    if info.file_size > ARCHIVE_MAX_MEMBER_BYTES:
+        return f"File is {info.file_size / 1024 / 1024:.1f} MB; the limit is {ARCHIVE_MAX_MEMBER_BYTES // 1024 // 1024} MB"
+    if info.file_size and info.file_size > info.compress_size * ARCHIVE_MAX_COMPRESSION_RATIO:
+        return f"Compression ratio above {ARCHIVE_MAX_COMPRESSION_RATIO}:1; refusing to decompress"
+    return None
+
+def read_archive_member(archive, info):
+    """Decompress one member, never reading past its declared size or the limit"""
+    limit = min(info.file_size, ARCHIVE_MAX_MEMBER_BYTES)
+    with archive.open(info) as member:
+        content = member.read(limit + 1)
+    if len(content) > limit:
+        raise ValueError("member is larger than its header declares")
+    return content
+
+async def iter_archive_members(file):
+    """
+    Yield (filename, member, error) for each file in an uploaded zip, reading
+    one member at a time straight from the upload's spooled file. Filenames
+    are "archive.zip/inner/path"; member is None when error says why not.
+    """
+    archive_name = file.filename or "archive.zip"
+    try:
+        # Uploads arrive spooled; resumable ones are fetched from GridFS first
+        source = file.file if hasattr(file, "file") else await file.spool()
+        # The central directory is read from the end of the file: blocking I/O
+        archive = await asyncio.to_thread(zipfile.ZipFile, source)
+    except (zipfile.BadZipFile, OSError) as e:
+        ERRORS.labels("archive").inc()
+        yield archive_name, None, f"Not a valid zip archive: {e}"
+        return
+
+    with archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+            and not os.path.basename(info.filename).startswith(".")
+        ]
+        if len(members) > ARCHIVE_MAX_MEMBERS:
+            ERRORS.labels("archive").inc()
+            yield archive_name, None, f"Archive has {len(members)} files; the limit is {ARCHIVE_MAX_MEMBERS}"
+            return
+
+        total_bytes = 0
+        for info in members:
+            filename = f"{archive_name}/{info.filename}"
+            error = archive_member_error(info)
+            if error is None and total_bytes + info.file_size > ARCHIVE_MAX_TOTAL_BYTES:
+                error = f"Archive exceeds {ARCHIVE_MAX_TOTAL_BYTES // 1024 // 1024} MB uncompressed; remaining files skipped"
+            if error is None:
+                try:
+                    with stage_timer("archive_read", os.path.splitext(info.filename)[1].lower()):
+                        content = await asyncio.to_thread(read_archive_member, archive, info)
+                except (zipfile.BadZipFile, ValueError, NotImplementedError, RuntimeError, OSError) as e:
+                    error = f"Could not extract file from archive: {e}"
+                else:
+                    total_bytes += len(content)
+                    yield filename, ArchiveMember(filename, content), None
+                    continue
+            ERRORS.labels("archive_member").inc()
+            logger.info("Archive member rejected", extra={"resume_name": filename, "reason": error})
+            yield filename, None, error
+
+async def iter_batch_files(files):
+    """(filename, file, error) for every file of a batch, expanding zip archives"""
     for file in files:
         filename = file.filename or "Unknown"
+        if os.path.splitext(filename)[1].lower() == ".zip":
+            # Closed as soon as the consumer stops, releasing the zip and its spooled upload
+            async with aclosing(iter_archive_members(file)) as members:
+                async for item in members:
+                    yield item
+        else:
+            yield filename, file, None
+
+async def screen_resume_file(batch, file):
+    """
+    Store, extract and screen one uploaded file.
+    Returns the API result, the screening document and the LLM cost of the file.
+    """
+    filename = file.filename or "Unknown"
+    current_date = batch["current_date"]
+    usage_records = []
+    _llm_usage_records.set(usage_records)
+
+    with stage_timer("format_detection"):
         suffix = os.path.splitext(filename)[1].lower()
-        print(f"Processing file: {filename} with suffix: {suffix}")  # Debug log
-        
-        # Define supported image extensions
-        supported_images = [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".webp"]
-        
-        # Read file content once
+
+    # Read file content once
+    with stage_timer("upload_read", suffix):
         file_content = await file.read()
-        
-        # Store file in GridFS regardless of type
-        file_id = None
+    file_hash_var.set(hashlib.sha256(file_content).hexdigest()[:16])
+    logger.info("Processing file", extra={"resume_name": filename, "format": suffix, "size": len(file_content)})
+
+    # Store file in GridFS regardless of type, unless it was uploaded there already
+    file_id = getattr(file, "file_id", None)
+    if file_id is None:
         try:
-            file_id = await fs.upload_from_stream(
-                filename,
-                file_content,
-                metadata={
-                    "content_type": file.content_type or "application/octet-stream",
-                    "upload_date": current_date,
-                    "recruiter_name": recruiter["username"],
-                     "file_size": len(file_content)
-                }
-            )
+            with stage_timer("gridfs_write", suffix):
+                file_id = await fs.upload_from_stream(
+                    filename,
+                    file_content,
+                    metadata={
+                        "content_type": file.content_type or "application/octet-stream",
+                        "upload_date": current_date,
+                        "recruiter_name": batch["recruiter_name"],
+                        "file_size": len(file_content)
+                    }
+                )
 
-            print(f"File stored in GridFS with ID: {file_id}")
+            logger.info("File stored in GridFS", extra={"file_id": str(file_id)})
         except Exception as e:
-            print(f"Failed to store file in GridFS: {e}")
-        
-        # Create temporary file for processing
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp.write(file_content)
-            tmp_path = tmp.name
-            
-        # Process different file types
-        if suffix == ".pdf":
-            resume_text = extract_text_from_pdf(tmp_path)
-        elif suffix == ".docx":
-            resume_text = extract_text_from_docx(tmp_path)
-        elif suffix == ".doc":
-            resume_text = extract_text_from_doc(tmp_path)
-        elif suffix in supported_images:
-            print(f"Processing image file: {filename} with suffix: {suffix}")  # Debug log
-            resume_text = extract_text_from_image(tmp_path)
-        else:
-            os.unlink(tmp_path)
-            error_msg = f"Unsupported file type: {suffix}. Only PDF, DOCX, and image files (JPG, JPEG, PNG, GIF, BMP, TIFF, WEBP) are allowed."
-            print(f"File rejected: {filename} with suffix: {suffix}")  # Debug log
-            results.append({
-                "filename": filename,
-                "error": error_msg
-            })
-            history.append({
-                "resume_name": filename,
-                "hiring_type": hiring_type_label,
-                "level": level_label,
-                "match_percent": None,
-                "decision": "Error",
-                "details": error_msg,
-                "upload_date": format_date_with_day(current_date),
-                "file_id": str(file_id) if file_id else None
-            })
-            continue
-        
-        # Analyze resume
-        analysis = analyze_resume(job_description, resume_text, hiring_type, level)
-        if isinstance(analysis, dict):
-            analysis["filename"] = filename
-            # Decision extraction
-            decision = analysis.get("decision")
-            if not decision and analysis.get("result_text"):
-                match = re.search(r"Decision:\s*(✅ Shortlist|❌ Reject)", analysis["result_text"])
-                if match:
-                    decision = match.group(1)
-            if decision and "Shortlist" in decision:
-                shortlisted += 1
-            elif decision and "Reject" in decision:
-                rejected += 1
-            decision_label = ("Shortlisted" if decision and "Shortlist" in decision else
-                              "Rejected" if decision and "Reject" in decision else "-")
-            analysis["decision"] = decision_label
-            results.append(analysis)
-            history.append({
-                "resume_name": filename,
-                "hiring_type": hiring_type_label,
-                "level": level_label,
-                "match_percent": analysis.get("match_percent"),
-                "decision": decision_label,
-                "details": analysis.get("result_text") or analysis.get("error", ""),
-                "upload_date": format_date_with_day(current_date),
-                "file_id": str(file_id) if file_id else None
-            })
-        else:
-            results.append({"filename": filename, "error": analysis})
-            history.append({
-                "resume_name": filename,
-                "hiring_type": hiring_type_label,
-                "level": level_label,
-                "match_percent": None,
-                "decision": "Error",
-                "details": analysis,
-                "upload_date": format_date_with_day(current_date),
-                "file_id": str(file_id) if file_id else None
-            })
-        
+            ERRORS.labels("gridfs_write").inc()
+            logger.error(f"Failed to store file in GridFS: {e}")
+
+    if suffix not in EXTRACTORS:
+        ERRORS.labels("unsupported_format").inc()
+        RESUMES_PROCESSED.labels(suffix or "none", "Error").inc()
+        error_msg = f"Unsupported file type: {suffix}. Only PDF, DOCX, and image files (JPG, JPEG, PNG, GIF, BMP, TIFF, WEBP) are allowed."
+        logger.info("File rejected: unsupported type", extra={"resume_name": filename, "format": suffix})
+        return (
+            {"filename": filename, "error": error_msg},
+            screening_document(batch, filename, file_id, "Error", error_msg),
+            0.0
+        )
+
+    # Create temporary file for processing
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        tmp.write(file_content)
+        tmp_path = tmp.name
+
+    try:
+        with stage_timer("extraction", suffix):
+            # Parsing and OCR (whose LLM calls block until their deadline) run off the event loop
+            resume_text = await asyncio.to_thread(extract_resume_text, suffix, tmp_path)
+        if file_id:
+            try:
+                # Rendering is CPU-bound work in poppler/Pillow, so keep it off the event loop
+                with stage_timer("thumbnail", suffix):
+                    thumbnail = await asyncio.to_thread(render_resume_thumbnail, suffix, tmp_path)
+                await store_resume_preview(
+                    file_id, filename, file.content_type or "application/octet-stream",
+                    len(file_content), thumbnail, resume_text
+                )
+            except Exception as e:
+                ERRORS.labels("preview").inc()
+                logger.error(f"Failed to store preview for {filename}: {e}")
+    finally:
         # Clean up temporary file
         os.unlink(tmp_path)
-    
-    # Save MIS record with history
-    await mis_collection.insert_one({
+
+    text_hash = None
+    duplicate = None
+    if is_extraction_error(resume_text):
+        ERRORS.labels("extraction").inc()
+    else:
+        # Look for near-duplicates before this text is indexed itself
+        # Shingling and hashing is pure-Python CPU work (tens of ms per resume), so keep it off the event loop
+        signature = await asyncio.to_thread(compute_minhash, resume_text)
+        duplicate = await find_near_duplicate(signature, lsh_bands(signature), batch["jd_key"])
+        text_hash = await index_candidate_text(
+            resume_text, filename, file_id, batch["recruiter_name"],
+            batch["hiring_type_label"], batch["level_label"], current_date, signature
+        )
+
+    # Analyze resume, unless a near-duplicate was already screened for this JD
+    prior_verdict = duplicate.pop("verdict", None) if duplicate else None
+    if batch["reuse_duplicate_verdicts"] and prior_verdict and prior_verdict.get("result_text"):
+        logger.info(f"Reusing verdict for {filename} from near-duplicate {duplicate['file_id']}")
+        analysis = {
+            "result_text": prior_verdict["result_text"],
+            "match_percent": prior_verdict.get("match_percent"),
+            "usage": None,
+            "reused_verdict": True
+        }
+    else:
+        analysis = await asyncio.to_thread(
+            analyze_resume, batch["jd"]["text"], resume_text, batch["hiring_type"], batch["level"]
+        )
+
+    if isinstance(analysis, dict):
+        analysis["filename"] = filename
+        if duplicate:
+            analysis["near_duplicate"] = duplicate
+        if text_hash and analysis.get("result_text") and not analysis.get("reused_verdict"):
+            await remember_verdict(text_hash, batch["jd_key"], analysis, file_id, current_date)
+        # Decision extraction
+        decision = analysis.get("decision")
+        if not decision and analysis.get("result_text"):
+            match = re.search(r"Decision:\s*(✅ Shortlist|❌ Reject)", analysis["result_text"])
+            if match:
+                decision = match.group(1)
+        decision_label = ("Shortlisted" if decision and "Shortlist" in decision else
+                          "Rejected" if decision and "Reject" in decision else "-")
+        analysis["decision"] = decision_label
+        result = analysis
+        screening = screening_document(
+            batch, filename, file_id, decision_label,
+            analysis.get("result_text") or analysis.get("error", ""),
+            match_percent=analysis.get("match_percent"),
+            near_duplicate_of=duplicate["file_id"] if duplicate else None
+        )
+    else:
+        decision_label = "Error"
+        result = {"filename": filename, "error": analysis}
+        screening = screening_document(batch, filename, file_id, "Error", analysis)
+    RESUMES_PROCESSED.labels(suffix, decision_label).inc()
+
+    cost = await record_llm_usage(
+        usage_records, batch["recruiter_name"], filename, file_id,
+        batch["hiring_type_label"], batch["level_label"], batch["jd"]["hash"], current_date
+    )
+    _llm_usage_records.set(None)
+    return result, screening, cost
+
+def batch_in_progress():
+    return HTTPException(
+        status_code=409,
+        detail="A batch with this Idempotency-Key is still being processed. Retry later to get its results.",
+        headers={"Retry-After": "30"}
+    )
+
+async def stored_screenings(batch_id):
+    """Screenings already checkpointed for a batch, by position"""
+    return {doc["position"]: doc async for doc in screenings_collection.find({"batch_id": batch_id})}
+
+async def claim_batch(batch, idempotency_key, existing):
+    """
+    Insert the batch header before any file is screened, or take over an
+    earlier attempt with the same Idempotency-Key whose worker stopped
+    renewing its lease. Returns the header.
+    """
+    lease_expires_at = datetime.utcnow() + timedelta(seconds=BATCH_LEASE_SECONDS)
+    if existing is None:
+        header = {
+            "_id": batch["batch_id"],
+            "recruiter_name": batch["recruiter_name"],
+            "total_resumes": 0,
+            "shortlisted": 0,
+            "rejected": 0,
+            "timestamp": batch["current_date"],
+            "jd_hash": batch["jd"]["hash"],
+            "hiring_type": batch["hiring_type"],
+            "level": batch["level"],
+            "status": "processing",
+            "lease_expires_at": lease_expires_at
+        }
+        if idempotency_key:
+            header["idempotency_key"] = idempotency_key
+        try:
+            await mis_collection.insert_one(header)
+        except DuplicateKeyError:
+            raise batch_in_progress()  # a concurrent request with the same key got there first
+        await update_daily_rollup(
+            batch["recruiter_name"], usage_day(batch["current_date"]),
+            batch["hiring_type_label"], batch["level_label"], {"uploads": 1}
+        )
+        return header
+    header = await mis_collection.find_one_and_update(
+        {"_id": existing["_id"], "status": "processing", "lease_expires_at": {"$lt": datetime.utcnow()}},
+        {"$set": {"lease_expires_at": lease_expires_at}},
+        return_document=ReturnDocument.AFTER
+    )
+    if header is None:
+        raise batch_in_progress()
+    logger.info(f"Resuming batch {header['_id']} for idempotency key {idempotency_key}")
+    return header
+
+async def count_screening(batch, screening):
+    """Fold one file's outcome into the batch header and the daily rollup, renewing the lease"""
+    decision = screening["decision"]
+    counts = {
+        "total_resumes": 1,
+        "shortlisted": int(decision == "Shortlisted"),
+        "rejected": int(decision == "Rejected")
+    }
+    await mis_collection.update_one({"_id": batch["batch_id"]}, {
+        "$inc": counts,
+        "$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=BATCH_LEASE_SECONDS)}
+    })
+    await update_daily_rollup(
+        batch["recruiter_name"], usage_day(batch["current_date"]),
+        batch["hiring_type_label"], batch["level_label"],
+        {**counts, "errors": 1 - counts["shortlisted"] - counts["rejected"]}
+    )
+    # A crash before this line leaves "counted" false and the resumed batch counts the
+    # file again, so a crash between the updates above can overcount the header by one
+    await screenings_collection.update_one({"_id": screening["_id"]}, {"$set": {"counted": True}})
+
+async def checkpoint_screening(batch, position, result, screening):
+    """Persist one file's outcome as soon as it is known, with the API result for replays"""
+    screening.update({
+        "position": position,
+        "result": {key: value for key, value in result.items() if key != "timings"},
+        "counted": False
+    })
+    with stage_timer("mongo_insert"):
+        await screenings_collection.insert_one(screening)
+        await count_screening(batch, screening)
+
+@asynccontextmanager
+async def batch_lease_heartbeat(batch_id):
+    """Renew the batch lease while the body runs, so one slow file can't outlast it"""
+    async def renew():
+        while True:
+            await asyncio.sleep(BATCH_LEASE_SECONDS / 3)
+            try:
+                await mis_collection.update_one(
+                    {"_id": batch_id, "status": "processing"},
+                    {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=BATCH_LEASE_SECONDS)}}
+                )
+            except Exception as e:
+                logger.error(f"Failed to renew lease of batch {batch_id}: {e}")
+
+    heartbeat = asyncio.create_task(renew(), name=f"batch-lease-{batch_id}")
+    try:
+        yield
+    finally:
+        heartbeat.cancel()
+        await asyncio.gather(heartbeat, return_exceptions=True)
+
+async def screen_batch(recruiter, job_description, hiring_type, level, files, reuse_duplicate_verdicts,
+                       idempotency_key=None):
+    """
+    Screen a batch of files (UploadFile, or anything with filename,
+    content_type and async read()) and record it. Each file's outcome is
+    saved as it finishes; a retry with the same Idempotency-Key returns the
+    files already done and screens only the rest.
+    """
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key must be 1-255 characters")
+    results = []
+    current_date = datetime.utcnow()
+    if not normalize_job_description(job_description):
+        raise HTTPException(status_code=400, detail="Job description must not be empty")
+    # Preprocess the JD once for the whole batch (and any later batch with the same JD)
+    jd = await prepare_job_description(job_description)
+    response_job = {"jd_hash": jd["hash"], "criteria": jd["criteria"]}
+
+    existing = None
+    if idempotency_key:
+        existing = await mis_collection.find_one({"recruiter_name": recruiter["username"], "idempotency_key": idempotency_key})
+    if existing is not None:
+        if existing["jd_hash"] != jd["hash"]:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different job description")
+        if (existing.get("hiring_type"), existing.get("level")) != (hiring_type, level):
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different hiring type or level")
+        if existing["status"] == "complete":
+            done = await stored_screenings(existing["_id"])
+            return JSONResponse(content={"results": [done[p]["result"] for p in sorted(done)], "job": response_job})
+        if existing["lease_expires_at"] > current_date:
+            raise batch_in_progress()
+
+    batch = {
+        "batch_id": existing["_id"] if existing else ObjectId(),
         "recruiter_name": recruiter["username"],
-        "total_resumes": len(files),
-        "shortlisted": shortlisted,
-        "rejected": rejected,
-        "timestamp": current_date,
-        "history": history
+        "hiring_type": hiring_type,
+        "level": level,
+        "hiring_type_label": get_hiring_type_label(hiring_type),
+        "level_label": get_level_label(level),
+        "jd": jd,
+        "jd_key": verdict_key(jd["hash"], hiring_type, level),
+        # A resumed batch keeps its original date, so its counters land on one day
+        "current_date": existing["timestamp"] if existing else current_date,
+        "reuse_duplicate_verdicts": reuse_duplicate_verdicts
+    }
+
+    # Enforce the recruiter's daily LLM budget before any call is made
+    budget = recruiter.get("daily_budget_usd", RECRUITER_DAILY_BUDGET_USD)
+    spent_today = await get_daily_llm_spend(recruiter["username"], usage_day(current_date)) if budget else 0.0
+    if budget and spent_today >= budget:
+        ERRORS.labels("budget_exceeded").inc()
+        raise HTTPException(
+            status_code=429,
+            detail=f"Daily LLM budget of ${budget:.2f} reached. Try again tomorrow or ask an admin to raise it."
+        )
+
+    await claim_batch(batch, idempotency_key, existing)
+    # A lone resume is someone waiting on the screen for one verdict; archives hold many
+    _llm_hedge.set(len(files) == 1 and not (files[0].filename or "").lower().endswith(".zip"))
+    done = await stored_screenings(batch["batch_id"]) if existing else {}
+
+    try:
+        async with batch_lease_heartbeat(batch["batch_id"]):
+            position = -1
+            async with aclosing(iter_batch_files(files)) as batch_files:
+                async for filename, file, upload_error in batch_files:
+                    position += 1
+                    if position in done:
+                        screening = done[position]
+                        if screening["resume_name"] != filename:
+                            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different set of files")
+                        if not screening.get("counted"):
+                            await count_screening(batch, screening)
+                        results.append(screening["result"])
+                        continue
+
+                    if upload_error:
+                        result = {"filename": filename, "error": upload_error}
+                        screening = screening_document(batch, filename, None, "Error", upload_error)
+                    elif budget and spent_today >= budget:
+                        ERRORS.labels("budget_exceeded").inc()
+                        error_msg = f"Skipped: daily LLM budget of ${budget:.2f} reached during this batch."
+                        result = {"filename": filename, "error": error_msg}
+                        screening = screening_document(batch, filename, None, "Error", error_msg)
+                    else:
+                        timings = {} if debug_timings_var.get() else None
+                        _file_timings.set(timings)
+                        note_loop_activity(file=filename)
+                        with FILES_IN_FLIGHT.track_inprogress(), trace_span("resume.file", filename=filename) as span:
+                            result, screening, cost = await screen_resume_file(batch, file)
+                            span["attributes"]["file_hash"] = file_hash_var.get()
+                        if timings is not None:
+                            timings["total"] = timings.pop("resume.file")
+                            result["timings"] = timings
+                        _file_timings.set(None)
+                        file_hash_var.set(None)
+                        spent_today += cost
+                    await checkpoint_screening(batch, position, result, screening)
+                    results.append(result)
+    except BaseException:
+        if idempotency_key:
+            # Let a corrected retry with the same key take over now instead of waiting out the lease
+            update = {"$set": {"lease_expires_at": datetime.utcnow()}}
+        else:
+            # Nothing can resume a batch without a key, so don't leave it looking unfinished
+            update = {"$set": {"status": "failed"}, "$unset": {"lease_expires_at": ""}}
+        await mis_collection.update_one({"_id": batch["batch_id"], "status": "processing"}, update)
+        raise
+
+    await mis_collection.update_one(
+        {"_id": batch["batch_id"]},
+        {"$set": {"status": "complete"}, "$unset": {"lease_expires_at": ""}}
+    )
+    return JSONResponse(content={"results": results, "job": response_job})
+
+@main_app.post("/analyze-resumes/")
+async def analyze_resumes(
+    job_description: str = Form(...),
+    hiring_type: str = Form(...),
+    level: str = Form(...),
+    files: List[UploadFile] = File(...),
+    reuse_duplicate_verdicts: bool = Form(False),
+    idempotency_key: Optional[str] = Header(None),
+    recruiter=Depends(get_current_recruiter)
+):
+    return await screen_batch(
+        recruiter, job_description, hiring_type, level, files, reuse_duplicate_verdicts, idempotency_key
+    )
+
+# --- Resumable Uploads ---
+# A tus-like protocol for batches too big to survive one multipart POST:
+#   POST /uploads                  {filename, size, content_type} -> upload_id, chunk_size
+#   PATCH /uploads/{id}            body bytes at the Upload-Offset header; partial bodies are kept
+#   HEAD /uploads/{id}             Upload-Offset: how much the server has, i.e. where to resume
+#   POST /analyze-uploads          screen finished uploads as one batch
+# Bytes go straight into fs.chunks in GridFS-sized chunks; once the last one
+# lands the fs.files document is written, so the upload is an ordinary
+# GridFS file from then on and is screened without being stored again.
+
+class StoredUpload:
+    """A finished resumable upload, with the parts of UploadFile the batch pipeline uses"""
+
+    def __init__(self, session):
+        self.filename = session["filename"]
+        self.content_type = session["content_type"]
+        self.file_id = session["file_id"]
+
+    async def read(self):
+        grid_out = await fs.open_download_stream(self.file_id)
+        return await grid_out.read()
+
+    async def spool(self):
+        """The upload as a seekable local file, for reading zip archives"""
+        grid_out = await fs.open_download_stream(self.file_id)
+        spooled = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MEMORY_BYTES)
+        async for chunk in iter_grid_out(grid_out, 0, grid_out.length):
+            spooled.write(chunk)
+        spooled.seek(0)
+        return spooled
+
+async def get_upload_session(upload_id, recruiter):
+    session = await upload_sessions_collection.find_one({
+        "_id": parse_object_id(upload_id), "recruiter_name": recruiter["username"]
     })
-    return JSONResponse(content={"results": results})
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
 
-@main_app.get("/download-resume/{file_id}")
-async def download_resume(file_id: str, recruiter=Depends(get_current_recruiter)):
+def upload_offset_headers(session, offset=None):
+    return {
+        "Upload-Offset": str(session["offset"] if offset is None else offset),
+        "Upload-Length": str(session["length"]),
+        "Cache-Control": "no-store"
+    }
+
+async def store_upload_chunk(session, offset, data):
+    """Write one GridFS chunk at offset and advance the session; returns the new offset"""
+    await fs_chunks_collection.update_one(
+        {"files_id": session["file_id"], "n": offset // UPLOAD_CHUNK_BYTES},
+        {"$set": {"data": Binary(data)}},
+        upsert=True
+    )
+    new_offset = offset + len(data)
+    # Compare-and-set, so two PATCHes racing for the same offset can't both advance it
+    advanced = await upload_sessions_collection.update_one(
+        {"_id": session["_id"], "offset": offset},
+        {"$set": {"offset": new_offset, "updated_at": datetime.utcnow()}}
+    )
+    if advanced.modified_count != 1:
+        # Tell the client where the winner left off, so it continues from there
+        current = await upload_sessions_collection.find_one({"_id": session["_id"]}) or session
+        raise HTTPException(
+            status_code=409, detail="Upload was advanced by another request",
+            headers=upload_offset_headers(current)
+        )
+    return new_offset
+
+async def complete_upload(session):
+    """Write the fs.files document that turns the stored chunks into a GridFS file"""
+    now = datetime.utcnow()
+    await fs_files_collection.update_one({"_id": session["file_id"]}, {"$setOnInsert": {
+        "length": session["length"],
+        "chunkSize": UPLOAD_CHUNK_BYTES,
+        "uploadDate": now,
+        "filename": session["filename"],
+        "metadata": {
+            "content_type": session["content_type"],
+            "upload_date": now,
+            "recruiter_name": session["recruiter_name"],
+            "file_size": session["length"]
+        }
+    }}, upsert=True)
+    await upload_sessions_collection.update_one(
+        {"_id": session["_id"]}, {"$set": {"status": "complete", "updated_at": now}}
+    )
+
+@main_app.post("/uploads", status_code=201)
+async def create_upload(upload: UploadSessionRequest, recruiter=Depends(get_current_recruiter)):
+    """Start a resumable upload of one file"""
+    filename = upload.filename.strip()
+    if not filename:
+        raise HTTPException(status_code=400, detail="Filename must not be empty")
+    if upload.size > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Files are limited to {UPLOAD_MAX_BYTES // 1024 // 1024} MB")
+    now = datetime.utcnow()
+    session = {
+        "_id": ObjectId(),
+        "recruiter_name": recruiter["username"],
+        "filename": filename,
+        "content_type": upload.content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        "length": upload.size,
+        "offset": 0,
+        "file_id": ObjectId(),
+        "status": "uploading",
+        "created_at": now,
+        "updated_at": now
+    }
+    await upload_sessions_collection.insert_one(session)
+    return JSONResponse(
+        status_code=201,
+        content={"upload_id": str(session["_id"]), "offset": 0, "length": upload.size, "chunk_size": UPLOAD_CHUNK_BYTES},
+        headers={"Location": f"/backend/uploads/{session['_id']}", **upload_offset_headers(session)}
+    )
+
+@main_app.head("/uploads/{upload_id}")
+async def upload_status(upload_id: str, recruiter=Depends(get_current_recruiter)):
+    """How many bytes the server has; resume the upload from there"""
+    session = await get_upload_session(upload_id, recruiter)
+    return Response(status_code=200, headers=upload_offset_headers(session))
+
+@main_app.patch("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, recruiter=Depends(get_current_recruiter)):
+    """
+    Append the body at Upload-Offset. It is written chunk by chunk as it
+    arrives, so a dropped connection keeps every complete chunk received.
+    Bodies must be a multiple of chunk_size, except the one ending the file.
+    """
+    session = await get_upload_session(upload_id, recruiter)
+    offset_header = request.headers.get("upload-offset", "")
+    if not offset_header.isdigit():
+        raise HTTPException(status_code=400, detail="Upload-Offset header is required")
+    offset = int(offset_header)
+    if offset != session["offset"]:
+        raise HTTPException(
+            status_code=409, detail=f"Upload is at offset {session['offset']}, not {offset}",
+            headers=upload_offset_headers(session)
+        )
+
+    buffer = bytearray()
     try:
-        grid_out = await fs.open_download_stream(ObjectId(file_id))
-        file_content = await grid_out.read()
-        
-        return Response(
-            content=file_content,
-            media_type=grid_out.metadata.get("content_type", "application/octet-stream"),
-            headers={
-                "Content-Disposition": f"attachment; filename={grid_out.filename}"
+        async for piece in request.stream():
+            buffer += piece
+            if offset + len(buffer) > session["length"]:
+                raise HTTPException(status_code=413, detail="Body runs past the declared upload size")
+            while len(buffer) >= UPLOAD_CHUNK_BYTES:
+                offset = await store_upload_chunk(session, offset, bytes(buffer[:UPLOAD_CHUNK_BYTES]))
+                del buffer[:UPLOAD_CHUNK_BYTES]
+    except ClientDisconnect:
+        # Expected when a connection drops; the client resumes from HEAD
+        logger.info(f"Upload {upload_id} interrupted at offset {offset}")
+        return Response(status_code=204, headers=upload_offset_headers(session, offset))
+    # A short chunk can only be the file's last; anything else is resent by the client
+    if buffer and offset + len(buffer) == session["length"]:
+        offset = await store_upload_chunk(session, offset, bytes(buffer))
+    if offset == session["length"] and session["status"] != "complete":
+        await complete_upload(session)
+    return Response(status_code=204, headers=upload_offset_headers(session, offset))
+
+@main_app.post("/analyze-uploads")
+async def analyze_uploads(
+    job_description: str = Form(...),
+    hiring_type: str = Form(...),
+    level: str = Form(...),
+    upload_ids: List[str] = Form(...),
+    reuse_duplicate_verdicts: bool = Form(False),
+    idempotency_key: Optional[str] = Header(None),
+    recruiter=Depends(get_current_recruiter)
+):
+    """Screen finished resumable uploads as one batch, in the order given"""
+    sessions = {}
+    async for session in upload_sessions_collection.find({
+        "_id": {"$in": [parse_object_id(upload_id) for upload_id in upload_ids]},
+        "recruiter_name": recruiter["username"]
+    }):
+        sessions[str(session["_id"])] = session
+    missing = [upload_id for upload_id in upload_ids if upload_id not in sessions]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Unknown uploads: {', '.join(missing)}")
+    unfinished = [upload_id for upload_id in upload_ids if sessions[upload_id]["status"] != "complete"]
+    if unfinished:
+        raise HTTPException(status_code=409, detail=f"Uploads not finished: {', '.join(unfinished)}")
+    files = [StoredUpload(sessions[upload_id]) for upload_id in upload_ids]
+    return await screen_batch(
+        recruiter, job_description, hiring_type, level, files, reuse_duplicate_verdicts, idempotency_key
+    )
+
+async def purge_stale_uploads(max_age_hours=UPLOAD_SESSION_MAX_AGE_HOURS):
+    """Delete unfinished uploads (and their chunks) not touched for max_age_hours; run from cron"""
+    cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
+    purged = 0
+    async for session in upload_sessions_collection.find({"status": "uploading", "updated_at": {"$lt": cutoff}}):
+        await fs_chunks_collection.delete_many({"files_id": session["file_id"]})
+        await upload_sessions_collection.delete_one({"_id": session["_id"]})
+        purged += 1
+    logger.info(f"Purged {purged} stale uploads")
+
+@main_app.get("/candidates/search")
+async def search_candidates(
+    q: str = Query(..., min_length=1, description='Keywords or "quoted phrases"; prefix a word with - to exclude it'),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+    recruiter=Depends(get_current_recruiter)
+):
+    """Full-text search over the extracted text of every screened resume"""
+    query = q.strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="Search query must not be empty")
+
+    text_filter = {"$text": {"$search": query}}
+    try:
+        total = await candidates_collection.count_documents(text_filter)
+        cursor = candidates_collection.find(
+            text_filter,
+            {
+                "score": {"$meta": "textScore"},
+                "text": 1,
+                "resume_name": 1,
+                "file_id": 1,
+                "recruiter_name": 1,
+                "hiring_type": 1,
+                "level": 1,
+                "last_seen": 1
             }
-        )
+        ).sort([("score", {"$meta": "textScore"})]).skip((page - 1) * page_size).limit(page_size)
+
+        terms = search_terms(query)
+        results = []
+        async for doc in cursor:
+            results.append({
+                "resume_name": doc.get("resume_name"),
+                "file_id": str(doc["file_id"]) if doc.get("file_id") else None,
+                "recruiter_name": doc.get("recruiter_name"),
+                "hiring_type": doc.get("hiring_type"),
+                "level": doc.get("level"),
+                "score": round(doc.get("score", 0), 4),
+                "snippet": search_snippet(doc.get("text", ""), terms),
+                "last_seen": format_date_with_day(doc["last_seen"]) if doc.get("last_seen") else None
+            })
     except Exception as e:
-        raise HTTPException(status_code=404, detail="File not found")
+        logger.error(f"Candidate search error: {e}")
+        raise HTTPException(status_code=500, detail="Candidate search failed")
 
-@main_app.get("/view-resume/{file_id}")
-async def view_resume(file_id: str, recruiter=Depends(get_current_recruiter)):
+    return {
+        "query": query,
+        "page": page,
+        "page_size": page_size,
+        "total": total,
+        "results": results
+    }
+
+@main_app.get("/usage-summary")
+async def usage_summary(
+    start: str = Query(None, description="First UTC day, YYYY-MM-DD (default: 30 days ago)"),
+    end: str = Query(None, description="Last UTC day, YYYY-MM-DD (default: today)"),
+    recruiter=Depends(get_current_recruiter)
+):
+    """
+    LLM tokens and cost per recruiter and role type, from the daily rollups.
+    Recruiters see only their own usage; admins see everyone's.
+    """
+    today = datetime.utcnow()
     try:
-        grid_out = await fs.open_download_stream(ObjectId(file_id))
-        file_content = await grid_out.read()
-        
-        return {
-            "filename": grid_out.filename,
-            "content_type": grid_out.metadata.get("content_type", "application/octet-stream"),
-            "size": len(file_content),
-            "content": base64.b64encode(file_content).decode('utf-8')
+        start_day = datetime.strptime(start, "%Y-%m-%d") if start else today - timedelta(days=30)
+        end_day = datetime.strptime(end, "%Y-%m-%d") if end else today
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+
+    match = {"date": {"$gte": usage_day(start_day), "$lte": usage_day(end_day)}}
+    if recruiter["username"] not in ADMIN_USERNAMES:
+        match["recruiter_name"] = recruiter["username"]
+    pipeline = [
+        {"$match": match},
+        {
+            "$group": {
+                "_id": {"recruiter_name": "$recruiter_name", "hiring_type": "$hiring_type", "level": "$level"},
+                "calls": {"$sum": "$calls"},
+                "errors": {"$sum": "$errors"},
+                "prompt_tokens": {"$sum": "$prompt_tokens"},
+                "cached_tokens": {"$sum": "$cached_tokens"},
+                "completion_tokens": {"$sum": "$completion_tokens"},
+                "cost_usd": {"$sum": "$cost_usd"}
+            }
+        },
+        {"$sort": {"cost_usd": -1}}
+    ]
+    rows = []
+    async for row in llm_usage_daily_collection.aggregate(pipeline):
+        rows.append({
+            **row["_id"],
+            "calls": row["calls"],
+            "errors": row["errors"],
+            "prompt_tokens": row["prompt_tokens"],
+            "cached_tokens": row["cached_tokens"],
+            "completion_tokens": row["completion_tokens"],
+            "cost_usd": round(row["cost_usd"], 4)
+        })
+
+    budget = recruiter.get("daily_budget_usd", RECRUITER_DAILY_BUDGET_USD)
+    return {
+        "start": usage_day(start_day),
+        "end": usage_day(end_day),
+        "total_cost_usd": round(sum(r["cost_usd"] for r in rows), 4),
+        "usage": rows,
+        "my_budget": {
+            "daily_budget_usd": budget or None,
+            "spent_today_usd": round(await get_daily_llm_spend(recruiter["username"], usage_day(today)), 4)
         }
-    except Exception as e:
+    }
+
+# --- Resume File Streaming ---
+RESUME_STREAM_CHUNK_BYTES = 255 * 1024  # GridFS default chunk size
+# Authenticated content: browsers may keep it, shared caches may not
+RESUME_CACHE_CONTROL = "private, max-age=3600"
+BYTE_RANGE_RE = re.compile(r"bytes=\s*(\d*)\s*-\s*(\d*)")  # single ranges only
+
+def http_date(dt):
+    """RFC 7231 date for a naive UTC datetime"""
+    return format_datetime(dt.replace(tzinfo=timezone.utc), usegmt=True)
+
+def content_disposition(kind, filename):
+    """kind is "inline" or "attachment"; non-ASCII names go in filename*"""
+    fallback = filename.encode("ascii", "ignore").decode().replace('"', "") or "resume"
+    return f"{kind}; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+def is_not_modified(request: Request, etag, last_modified: datetime):
+    """If-None-Match wins over If-Modified-Since, as RFC 7232 requires"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+def parse_byte_range(header, size):
+    """
+    Inclusive (start, end) for a single "bytes=" range, or None to send the
+    whole file (no header, malformed, or multiple ranges). Raises ValueError
+    when the range can't be satisfied.
+    """
+    match = BYTE_RANGE_RE.fullmatch(header.strip()) if header else None
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+async def iter_grid_out(grid_out, start, length):
+    """Yield length bytes of a GridFS file from start, one chunk at a time"""
+    grid_out.seek(start)
+    remaining = length
+    while remaining > 0:
+        chunk = await grid_out.read(min(RESUME_STREAM_CHUNK_BYTES, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+async def stream_resume_file(request: Request, file_id: str, disposition: str):
+    """
+    Stream a stored resume with Range support and cache validators.
+    GridFS files never change, so the file id is a strong ETag.
+    """
+    try:
+        grid_out = await fs.open_download_stream(ObjectId(file_id))
+    except Exception:
+        raise HTTPException(status_code=404, detail="File not found")
+    etag = f'"{grid_out._id}"'
+    last_modified = http_date(grid_out.upload_date)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": RESUME_CACHE_CONTROL,
+        "Accept-Ranges": "bytes"
+    }
+    if is_not_modified(request, etag, grid_out.upload_date):
+        return Response(status_code=304, headers=headers)
+
+    size = grid_out.length
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    # A stale If-Range means the client's partial copy is outdated: send it all
+    if if_range is None or if_range.strip() in (etag, last_modified):
+        try:
+            byte_range = parse_byte_range(request.headers.get("range"), size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    else:
+        start, end = 0, size - 1
+        status_code = 200
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Disposition"] = content_disposition(disposition, grid_out.filename)
+    return StreamingResponse(
+        iter_grid_out(grid_out, start, end - start + 1),
+        status_code=status_code,
+        media_type=(grid_out.metadata or {}).get("content_type", "application/octet-stream"),
+        headers=headers
+    )
+
+@main_app.get("/resume-preview/{file_id}")
+async def resume_preview(file_id: str, request: Request, recruiter=Depends(get_current_recruiter)):
+    """First-page thumbnail and text snapshot; the original stays behind /view-resume"""
+    try:
+        oid = ObjectId(file_id)
+    except Exception:
         raise HTTPException(status_code=404, detail="File not found")
+    preview = await resume_previews_collection.find_one({"_id": oid})
+    if preview is None:
+        preview = await build_resume_preview(oid)
+    etag = f'"preview-{file_id}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(preview["created_at"]),
+        "Cache-Control": RESUME_CACHE_CONTROL
+    }
+    if is_not_modified(request, etag, preview["created_at"]):
+        return Response(status_code=304, headers=headers)
+    thumbnail = preview.get("thumbnail")
+    return JSONResponse({
+        "filename": preview.get("filename"),
+        "content_type": preview.get("content_type"),
+        "size": preview.get("size"),
+        "thumbnail": f"data:image/jpeg;base64,{base64.b64encode(thumbnail).decode()}" if thumbnail else None,
+        "text": preview.get("text"),
+        "text_truncated": preview.get("text_truncated", False)
+    }, headers=headers)
+
+@main_app.get("/download-resume/{file_id}")
+async def download_resume(file_id: str, request: Request, recruiter=Depends(get_current_recruiter)):
+    return await stream_resume_file(request, file_id, "attachment")
+
+@main_app.get("/view-resume/{file_id}")
+async def view_resume(file_id: str, request: Request, recruiter=Depends(get_current_recruiter)):
+    """The original file inline, for the frontend viewer to load as a blob"""
+    return await stream_resume_file(request, file_id, "inline")
 
 # @main_app.get("/mis-summary")
 # async def mis_summary():
@@ -1303,107 +3896,140 @@ async def view_resume(file_id: str, recruiter=Depends(get_current_recruiter)):
 #             "history": flat_history
 #         })
 #     return {"summary": summary}
+HISTORY_DEFAULT_LIMIT = 50
+HISTORY_MAX_LIMIT = 200
+
+def encode_history_cursor(created_at, doc_id):
+    """Opaque keyset cursor: position of the last returned screening"""
+    raw = json.dumps([created_at.isoformat(), str(doc_id)])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_history_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), ObjectId(doc_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_day(value, name):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} date. Use YYYY-MM-DD")
+
+
+async def resumes_per_day(pairs):
+    """Resumes uploaded per (recruiter, UTC day) for the given (recruiter, YYYY-MM-DD) pairs"""
+    if not pairs:
+        return {}
+    pipeline = [
+        {
+            "$match": {
+                "recruiter_name": {"$in": sorted({recruiter for recruiter, _ in pairs})},
+                "date": {"$in": sorted({day for _, day in pairs})}
+            }
+        },
+        {
+            "$group": {
+                "_id": {"recruiter_name": "$recruiter_name", "day": "$date"},
+                "resumes": {"$sum": "$total_resumes"}
+            }
+        }
+    ]
+    counts = {}
+    async for row in daily_rollups_collection.aggregate(pipeline):
+        counts[(row["_id"]["recruiter_name"], row["_id"]["day"])] = row["resumes"]
+    return counts
+
+@main_app.get("/history")
+async def history(
+    recruiter: str = Query(None, description="Only this recruiter's screenings"),
+    decision: str = Query(None, description="Shortlisted, Rejected or Error"),
+    hiring_type: str = Query(None, description="Sales, IT, Non-Sales or Sales Support"),
+    level: str = Query(None, description="Fresher or Experienced"),
+    start: str = Query(None, description="First UTC day, YYYY-MM-DD"),
+    end: str = Query(None, description="Last UTC day, YYYY-MM-DD"),
+    limit: int = Query(HISTORY_DEFAULT_LIMIT, ge=1, le=HISTORY_MAX_LIMIT),
+    cursor: str = Query(None, description="next_cursor from the previous page"),
+    current_recruiter=Depends(get_current_recruiter)
+):
+    """
+    Screening history, newest first, with keyset pagination over
+    (created_at, _id) instead of one unbounded payload.
+    """
+    filters = []
+    if recruiter:
+        filters.append({"recruiter_name": recruiter})
+    if decision:
+        filters.append({"decision": decision})
+    if hiring_type:
+        filters.append({"hiring_type": hiring_type})
+    if level:
+        filters.append({"level": level})
+    if start:
+        filters.append({"created_at": {"$gte": parse_day(start, "start")}})
+    if end:
+        filters.append({"created_at": {"$lt": parse_day(end, "end") + timedelta(days=1)}})
+    if cursor:
+        last_created_at, last_id = decode_history_cursor(cursor)
+        filters.append({"$or": [
+            {"created_at": {"$lt": last_created_at}},
+            {"created_at": last_created_at, "_id": {"$lt": last_id}}
+        ]})
+
+    docs = []
+    async for doc in screenings_collection.find(
+        {"$and": filters} if filters else {}
+    ).sort([("created_at", -1), ("_id", -1)]).limit(limit + 1):
+        docs.append(doc)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_history_cursor(docs[-1]["created_at"], docs[-1]["_id"])
+
+    counts = await resumes_per_day({(doc["recruiter_name"], usage_day(doc["created_at"])) for doc in docs})
+
+    items = []
+    for doc in docs:
+        item = screening_to_history_item(doc)
+        item["counts_per_day"] = counts.get((doc["recruiter_name"], usage_day(doc["created_at"])), 0)
+        items.append(item)
+
+    return {"items": items, "next_cursor": next_cursor}
+
 @main_app.get("/mis-summary")
 async def mis_summary():
+    """Per-recruiter totals only; individual screenings are paged through /history"""
     pipeline = [
         {
             "$group": {
                 "_id": "$recruiter_name",
-                "uploads": {"$sum": 1},
+                "uploads": {"$sum": "$uploads"},
                 "total_resumes": {"$sum": "$total_resumes"},
                 "shortlisted": {"$sum": "$shortlisted"},
-                "rejected": {"$sum": "$rejected"},
-                "history": {"$push": "$history"}
+                "rejected": {"$sum": "$rejected"}
             }
         },
         {"$sort": {"_id": 1}}
     ]
-    
+
     summary = []
-    async for row in mis_collection.aggregate(pipeline):
-        # Flatten the list of lists in history and add timestamp for sorting
-        flat_history = []
-        for sublist in row["history"]:
-            for item in sublist:
-                flat_history.append(item)
-        
-        # Sort by timestamp from the parent document (newest first)
-        # We need to fetch the timestamp from the original mis_collection documents
-        # Let's use a different approach - get all records for this recruiter
-        
+    async for row in daily_rollups_collection.aggregate(pipeline):
         summary.append({
             "recruiter_name": row["_id"],
             "uploads": row["uploads"],
             "resumes": row["total_resumes"],
             "shortlisted": row["shortlisted"],
-            "rejected": row["rejected"],
-            "history": flat_history
+            "rejected": row["rejected"]
         })
-    
-    # Now fetch all MIS records sorted by timestamp descending
-    all_records = []
-    async for record in mis_collection.find().sort("timestamp", -1):
-        for history_item in record.get("history", []):
-            history_item["_timestamp"] = record["timestamp"]
-            all_records.append({
-                "recruiter_name": record["recruiter_name"],
-                "history_item": history_item
-            })
-    
-    # Rebuild summary with sorted history
-    recruiter_history = {}
-    for record in all_records:
-        recruiter = record["recruiter_name"]
-        if recruiter not in recruiter_history:
-            recruiter_history[recruiter] = []
-        recruiter_history[recruiter].append(record["history_item"])
-    
-    # Update summary with sorted history
-    for summary_item in summary:
-        recruiter = summary_item["recruiter_name"]
-        if recruiter in recruiter_history:
-            flat_history = recruiter_history[recruiter]
-            
-            # Calculate daily counts
-            daily_counts = {}
-            for item in flat_history:
-                upload_date = item.get("upload_date", "")
-                if upload_date:
-                    date_part = upload_date.split(',')[0] if ',' in upload_date else upload_date
-                    daily_counts[date_part] = daily_counts.get(date_part, 0) + 1
-            
-            # Add daily count to each history item
-            for item in flat_history:
-                upload_date = item.get("upload_date", "")
-                if upload_date:
-                    date_part = upload_date.split(',')[0] if ',' in upload_date else upload_date
-                    item["counts_per_day"] = daily_counts.get(date_part, 0)
-                else:
-                    item["counts_per_day"] = 0
-                
-                # Remove the temporary timestamp field
-                item.pop("_timestamp", None)
-            
-            summary_item["history"] = flat_history
-    
     return {"summary": summary}
 
-@main_app.get("/daily-reports")
-async def daily_reports():
-    # Get today's date in UTC
-    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    tomorrow = today + timedelta(days=1)
-    
-    # Aggregate data for today only
+async def reports_for_day(day):
+    """Per-recruiter totals for one UTC day, read from the daily rollups"""
     pipeline = [
-        {
-            "$match": {
-                "timestamp": {
-                    "$gte": today,
-                    "$lt": tomorrow
-                }
-            }
-        },
+        {"$match": {"date": usage_day(day)}},
         {
             "$group": {
                 "_id": "$recruiter_name",
@@ -1414,67 +4040,34 @@ async def daily_reports():
         },
         {"$sort": {"_id": 1}}
     ]
-    
-    daily_data = []
-    async for row in mis_collection.aggregate(pipeline):
-        daily_data.append({
+
+    report_data = []
+    async for row in daily_rollups_collection.aggregate(pipeline):
+        report_data.append({
             "recruiter_name": row["_id"],
             "total_resumes": row["total_resumes"],
             "shortlisted": row["shortlisted"],
             "rejected": row["rejected"]
         })
-    
-    # Format today's date
-    today_formatted = format_date_with_day(today)
-    
+    return report_data
+
+@main_app.get("/daily-reports")
+async def daily_reports():
+    # Get today's date in UTC
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
     return {
-        "date": today_formatted,
-        "reports": daily_data
+        "date": format_date_with_day(today),
+        "reports": await reports_for_day(today)
     }
 
 
 @main_app.get("/previous-day-reports")
 async def previous_day_reports():
     # Get yesterday's date in UTC
-    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    yesterday = today - timedelta(days=1)
-    
-    # Aggregate data for yesterday only
-    pipeline = [
-        {
-            "$match": {
-                "timestamp": {
-                    "$gte": yesterday,
-                    "$lt": today
-                }
-            }
-        },
-        {
-            "$group": {
-                "_id": "$recruiter_name",
-                "total_resumes": {"$sum": "$total_resumes"},
-                "shortlisted": {"$sum": "$shortlisted"},
-                "rejected": {"$sum": "$rejected"}
-            }
-        },
-        {"$sort": {"_id": 1}}
-    ]
-    
-    previous_day_data = []
-    async for row in mis_collection.aggregate(pipeline):
-        previous_day_data.append({
-            "recruiter_name": row["_id"],
-            "total_resumes": row["total_resumes"],
-            "shortlisted": row["shortlisted"],
-            "rejected": row["rejected"]
-        })
-    
-    # Format yesterday's date
-    yesterday_formatted = format_date_with_day(yesterday)
-    
+    yesterday = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
     return {
-        "date": yesterday_formatted,
-        "reports": previous_day_data
+        "date": format_date_with_day(yesterday),
+        "reports": await reports_for_day(yesterday)
     }
 
 @main_app.get("/reports/{date_type}")
@@ -1487,56 +4080,19 @@ async def get_reports_by_date(date_type: str):
     
     if date_type == "today":
         start_date = today
-        end_date = today + timedelta(days=1)
     elif date_type == "yesterday":
         start_date = today - timedelta(days=1)
-        end_date = today
     else:
         try:
             # Try to parse specific date (YYYY-MM-DD format)
-            parsed_date = datetime.strptime(date_type, "%Y-%m-%d").replace(hour=0, minute=0, second=0, microsecond=0)
-            start_date = parsed_date
-            end_date = parsed_date + timedelta(days=1)
+            start_date = datetime.strptime(date_type, "%Y-%m-%d")
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format. Use 'today', 'yesterday', or YYYY-MM-DD")
     
-    # Aggregate data for the specified date range
-    pipeline = [
-        {
-            "$match": {
-                "timestamp": {
-                    "$gte": start_date,
-                    "$lt": end_date
-                }
-            }
-        },
-        {
-            "$group": {
-                "_id": "$recruiter_name",
-                "total_resumes": {"$sum": "$total_resumes"},
-                "shortlisted": {"$sum": "$shortlisted"},
-                "rejected": {"$sum": "$rejected"}
-            }
-        },
-        {"$sort": {"_id": 1}}
-    ]
-    
-    report_data = []
-    async for row in mis_collection.aggregate(pipeline):
-        report_data.append({
-            "recruiter_name": row["_id"],
-            "total_resumes": row["total_resumes"],
-            "shortlisted": row["shortlisted"],
-            "rejected": row["rejected"]
-        })
-    
-    # Format the date
-    date_formatted = format_date_with_day(start_date)
-    
     return {
-        "date": date_formatted,
+        "date": format_date_with_day(start_date),
         "date_type": date_type,
-        "reports": report_data
+        "reports": await reports_for_day(start_date)
     }
 
 @main_app.get("/health")
@@ -1551,6 +4107,18 @@ async def root():
 async def backend_root():
     return {"message": "Backend API is live!"}
 
+# Maintenance commands: python main.py <command>
+COMMANDS = {
+    "backfill-rollups": backfill_daily_rollups,
+    "migrate-screenings": migrate_embedded_history,
+    "purge-uploads": purge_stale_uploads,
+}
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    if len(sys.argv) > 1:
+        if sys.argv[1] not in COMMANDS:
+            sys.exit(f"Unknown command {sys.argv[1]!r}. Available: {', '.join(COMMANDS)}")
+        asyncio.run(COMMANDS[sys.argv[1]]())
+    else:
+        import uvicorn
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -8,6 +8,74 @@ import "./App.css";
 const API_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:8000/backend";
 
 // --- HELPER FUNCTIONS ---
+const UPLOAD_CHUNKS_PER_REQUEST = 8; // ~2 MB per PATCH
+const UPLOAD_MAX_RETRIES = 5;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+async function uploadOffset(uploadId, token) {
+  const response = await fetch(`${API_URL}/uploads/${uploadId}`, {
+    method: "HEAD",
+    headers: { Authorization: `Bearer ${token}` },
+  });
+  if (!response.ok) throw new Error("Upload not found on the server");
+  return Number(response.headers.get("Upload-Offset"));
+}
+
+// Resumable upload of one file (POST /uploads, then PATCH at offsets).
+// `session` is filled in place, so passing it back after a failure
+// resumes from what the server already has instead of starting over.
+async function uploadResumable(file, token, session) {
+  const auth = { Authorization: `Bearer ${token}` };
+  if (!session.uploadId) {
+    const response = await fetch(`${API_URL}/uploads`, {
+      method: "POST",
+      headers: { ...auth, "Content-Type": "application/json" },
+      body: JSON.stringify({ filename: file.name, size: file.size, content_type: file.type || null }),
+    });
+    const data = await response.json();
+    if (!response.ok) throw new Error(data.detail || `Could not start uploading ${file.name}`);
+    Object.assign(session, { uploadId: data.upload_id, chunkSize: data.chunk_size, offset: 0 });
+  } else {
+    session.offset = await uploadOffset(session.uploadId, token);
+  }
+
+  const step = session.chunkSize * UPLOAD_CHUNKS_PER_REQUEST;
+  let failures = 0;
+  while (session.offset < file.size) {
+    try {
+      const response = await fetch(`${API_URL}/uploads/${session.uploadId}`, {
+        method: "PATCH",
+        headers: {
+          ...auth,
+          "Upload-Offset": String(session.offset),
+          "Content-Type": "application/offset+octet-stream",
+        },
+        body: file.slice(session.offset, session.offset + step),
+      });
+      // 409 means we were behind or ahead; either way the header says where to continue
+      if (!response.ok && response.status !== 409) {
+        const data = await response.json().catch(() => ({}));
+        const err = new Error(data.detail || `Uploading ${file.name} failed`);
+        err.fatal = response.status < 500;
+        throw err;
+      }
+      const offsetHeader = response.headers.get("Upload-Offset");
+      session.offset = offsetHeader === null
+        ? await uploadOffset(session.uploadId, token)
+        : Number(offsetHeader);
+      failures = 0;
+    } catch (err) {
+      failures += 1;
+      if (err.fatal || failures > UPLOAD_MAX_RETRIES) throw err;
+      await sleep(500 * 2 ** failures);
+      // Ask how much arrived, so only the missing bytes are sent again
+      session.offset = await uploadOffset(session.uploadId, token).catch(() => session.offset);
+    }
+  }
+  return session.uploadId;
+}
+
 function extractDecision(result) {
   if (result.decision && result.decision !== "-") {
     if (result.decision.includes("Shortlist"))
@@ -84,7 +152,13 @@ function ResumeScreening({ token }) {
   const [hiringType, setHiringType] = useState("1");
   const [level, setLevel] = useState("1");
   const [loading, setLoading] = useState(false);
+  const [progress, setProgress] = useState("");
   const fileInputRef = useRef(null);
+  // Upload sessions by file, kept across attempts so a retry resumes them
+  const uploadsRef = useRef(new Map());
+  // Idempotency-Key of the last submission; resubmitting the same batch reuses it,
+  // so the server returns files already screened instead of screening them again
+  const submissionRef = useRef(null);
 
   const handleFileChange = (e) => {
     if (e.target.files) {
@@ -105,28 +179,43 @@ function ResumeScreening({ token }) {
     if (files.length === 0) return alert("Please select at least one resume");
 
     setLoading(true);
-    const formData = new FormData();
-    formData.append("job_description", jd);
-    formData.append("hiring_type", hiringType);
-    formData.append("level", level);
-    files.forEach((file) => formData.append("files", file));
-
     try {
-      const response = await fetch(`${API_URL}/analyze-resumes/`, {
+      const uploadIds = [];
+      for (const [index, file] of files.entries()) {
+        setProgress(`Uploading ${index + 1} of ${files.length}...`);
+        const key = `${file.name}:${file.size}:${file.lastModified}`;
+        if (!uploadsRef.current.has(key)) uploadsRef.current.set(key, {});
+        uploadIds.push(await uploadResumable(file, token, uploadsRef.current.get(key)));
+      }
+
+      setProgress("Evaluating...");
+      const formData = new FormData();
+      formData.append("job_description", jd);
+      formData.append("hiring_type", hiringType);
+      formData.append("level", level);
+      uploadIds.forEach((uploadId) => formData.append("upload_ids", uploadId));
+      const signature = JSON.stringify([jd, hiringType, level, uploadIds]);
+      if (submissionRef.current?.signature !== signature) {
+        submissionRef.current = { signature, key: crypto.randomUUID() };
+      }
+      const response = await fetch(`${API_URL}/analyze-uploads`, {
         method: "POST",
         body: formData,
-        headers: { Authorization: `Bearer ${token}` },
+        headers: { Authorization: `Bearer ${token}`, "Idempotency-Key": submissionRef.current.key },
       });
       const data = await response.json();
       if (!response.ok) throw new Error(data.detail || "Analysis failed");
       setResults(data.results || []);
       setFiles([]);
+      uploadsRef.current.clear();
+      submissionRef.current = null;
       if (fileInputRef.current) {
         fileInputRef.current.value = "";
       }
     } catch (err) {
       alert(`Error: ${err.message}`);
     }
+    setProgress("");
     setLoading(false);
   };
 
@@ -189,13 +278,13 @@ function ResumeScreening({ token }) {
 
           <div className="upload-zone" onClick={() => fileInputRef.current?.click()}>
             <AiOutlineCloudUpload size={48} color="#2563EB" />
-            <p style={{ marginTop: '1rem', color: '#6B7280' }}>Click to upload resumes (PDF, DOCX, Image)</p>
+            <p style={{ marginTop: '1rem', color: '#6B7280' }}>Click to upload resumes (PDF, DOCX, Image, or a ZIP of them)</p>
             <input
               id="file-upload"
               ref={fileInputRef}
               type="file"
               multiple
-              accept=".pdf,.doc,.docx,.png,.jpg,.jpeg"
+              accept=".pdf,.doc,.docx,.png,.jpg,.jpeg,.zip"
               onChange={handleFileChange}
               style={{ display: 'none' }}
             />
@@ -221,7 +310,7 @@ function ResumeScreening({ token }) {
               onClick={handleSubmit}
               disabled={loading}
             >
-              {loading ? "Evaluating..." : "Evaluate Resumes"}
+              {loading ? progress || "Evaluating..." : "Evaluate Resumes"}
             </button>
           </div>
         </div>
@@ -269,11 +358,15 @@ function ResumeScreening({ token }) {
 }
 
 // 3. MIS Summary Page
-function MISSummary({ setViewingFile, setViewingFilename }) {
+const HISTORY_PAGE_SIZE = 50;
+
+function MISSummary({ setViewingFile, setViewingFilename, token }) {
   const [mis, setMis] = useState([]);
   const [loading, setLoading] = useState(false);
   const [openDetails, setOpenDetails] = useState({});
   const [openHistory, setOpenHistory] = useState({});
+  // recruiter name -> { items, nextCursor, loading }
+  const [histories, setHistories] = useState({});
 
   const fetchMIS = async () => {
     setLoading(true);
@@ -284,6 +377,7 @@ function MISSummary({ setViewingFile, setViewingFilename }) {
       setMis(data.summary || []);
       setOpenDetails({});
       setOpenHistory({});
+      setHistories({});
     } catch (err) {
       alert(err.message);
     }
@@ -291,12 +385,42 @@ function MISSummary({ setViewingFile, setViewingFilename }) {
   };
 
   useEffect(() => { fetchMIS(); }, []);
+
+  const fetchHistory = async (recruiterName, cursor = null) => {
+    setHistories((prev) => ({
+      ...prev,
+      [recruiterName]: { items: [], nextCursor: null, ...prev[recruiterName], loading: true },
+    }));
+    try {
+      const params = new URLSearchParams({ recruiter: recruiterName, limit: HISTORY_PAGE_SIZE });
+      if (cursor) params.set("cursor", cursor);
+      const response = await fetch(`${API_URL}/history?${params}`, {
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      const data = await response.json();
+      if (!response.ok) throw new Error(data.detail);
+      setHistories((prev) => ({
+        ...prev,
+        [recruiterName]: {
+          items: [...(cursor ? prev[recruiterName]?.items || [] : []), ...(data.items || [])],
+          nextCursor: data.next_cursor,
+          loading: false,
+        },
+      }));
+    } catch (err) {
+      setHistories((prev) => ({ ...prev, [recruiterName]: { ...prev[recruiterName], loading: false } }));
+      alert(err.message);
+    }
+  };
   
   const toggleDetails = (key) => {
     setOpenDetails((prev) => ({ ...prev, [key]: !prev[key] }));
   };
   
-  const toggleHistory = (key) => {
+  const toggleHistory = (key, recruiterName) => {
+    if (!openHistory[key] && !histories[recruiterName]) {
+      fetchHistory(recruiterName);
+    }
     setOpenHistory((prev) => ({ ...prev, [key]: !prev[key] }));
   };
 
@@ -317,6 +441,7 @@ function MISSummary({ setViewingFile, setViewingFilename }) {
       <div className="mis-grid">
         {mis.map((row, idx) => {
           const historyOpen = openHistory[idx];
+          const recruiterHistory = histories[row.recruiter_name] || { items: [], nextCursor: null, loading: false };
           return (
             <div className="mis-card" key={row.recruiter_name || idx}>
               <div className="mis-card-header">
@@ -326,11 +451,11 @@ function MISSummary({ setViewingFile, setViewingFilename }) {
                     {row.uploads} uploads · {row.resumes} resumes
                   </div>
                 </div>
-                {row.history?.length > 0 ? (
+                {row.resumes > 0 ? (
                   <button
                     type="button"
                     className="btn btn-outline btn-sm"
-                    onClick={() => toggleHistory(idx)}
+                    onClick={() => toggleHistory(idx, row.recruiter_name)}
                   >
                     {historyOpen ? "Hide History" : "View History"}
                   </button>
@@ -354,7 +479,11 @@ function MISSummary({ setViewingFile, setViewingFilename }) {
                 </div>
               </div>
 
-              {historyOpen && row.history?.length > 0 && (
+              {historyOpen && recruiterHistory.loading && recruiterHistory.items.length === 0 && (
+                <div className="history-panel">Loading history...</div>
+              )}
+
+              {historyOpen && recruiterHistory.items.length > 0 && (
                 <div className="history-panel">
                   <table className="history-table">
                     <thead>
@@ -370,7 +499,7 @@ function MISSummary({ setViewingFile, setViewingFilename }) {
                       </tr>
                     </thead>
                     <tbody>
-                      {row.history.map((h, hidx) => {
+                      {recruiterHistory.items.map((h, hidx) => {
                         const detailKey = `${idx}-${hidx}`;
                         return (
                           <Fragment key={detailKey}>
@@ -427,6 +556,18 @@ function MISSummary({ setViewingFile, setViewingFilename }) {
                       })}
                     </tbody>
                   </table>
+                  {recruiterHistory.nextCursor && (
+                    <div style={{ textAlign: "center", marginTop: "1rem" }}>
+                      <button
+                        type="button"
+                        className="btn btn-outline btn-sm"
+                        onClick={() => fetchHistory(row.recruiter_name, recruiterHistory.nextCursor)}
+                        disabled={recruiterHistory.loading}
+                      >
+                        {recruiterHistory.loading ? "Loading..." : "Load More"}
+                      </button>
+                    </div>
+                  )}
                 </div>
               )}
             </div>
@@ -528,35 +669,61 @@ function DailyReports() {
 // 5. Resume Viewer Modal
 // Resume Viewer Component
 function ResumeViewer({ fileId, filename, onClose, token }) {
+  const [preview, setPreview] = useState(null);
+  const [showFull, setShowFull] = useState(false);
+  const [fullLoading, setFullLoading] = useState(false);
   const [fileData, setFileData] = useState(null);
   const [blobUrl, setBlobUrl] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState("");
 
+  // Start with the small preview; the original file is only fetched on demand
+  useEffect(() => {
+    const fetchPreview = async () => {
+      setShowFull(false);
+      try {
+        const response = await fetch(`${API_URL}/resume-preview/${fileId}`, {
+          headers: {
+            Authorization: `Bearer ${token}`,
+          },
+        });
+        const data = await response.json();
+        if (!response.ok) {
+          throw new Error(data.detail || "Failed to load preview");
+        }
+        setPreview(data);
+      } catch (err) {
+        setError(err.message);
+      }
+      setLoading(false);
+    };
+
+    if (fileId) {
+      fetchPreview();
+    }
+  }, [fileId, token]);
+
   useEffect(() => {
     let objectUrl = null;
     const fetchFile = async () => {
+      setFullLoading(true);
       try {
         const response = await fetch(`${API_URL}/view-resume/${fileId}`, {
           headers: {
             Authorization: `Bearer ${token}`,
           },
         });
-        const data = await response.json();
         if (!response.ok) {
+          const data = await response.json().catch(() => ({}));
           throw new Error(data.detail || "Failed to load file");
         }
-        setFileData(data);
-        
-        // Convert base64 to blob URL for better PDF rendering
-        if (data.content_type?.includes("pdf")) {
-          const byteCharacters = atob(data.content);
-          const byteNumbers = new Array(byteCharacters.length);
-          for (let i = 0; i < byteCharacters.length; i++) {
-            byteNumbers[i] = byteCharacters.charCodeAt(i);
-          }
-          const byteArray = new Uint8Array(byteNumbers);
-          const blob = new Blob([byteArray], { type: 'application/pdf' });
+
+        // The file is streamed as-is; render it straight from a blob URL
+        const blob = await response.blob();
+        const contentType =
+          response.headers.get("Content-Type") || blob.type || "application/octet-stream";
+        setFileData({ content_type: contentType, size: blob.size });
+        if (contentType.includes("pdf") || contentType.includes("image")) {
           objectUrl = URL.createObjectURL(blob);
           setBlobUrl(objectUrl);
         } else {
@@ -565,10 +732,10 @@ function ResumeViewer({ fileId, filename, onClose, token }) {
       } catch (err) {
         setError(err.message);
       }
-      setLoading(false);
+      setFullLoading(false);
     };
 
-    if (fileId) {
+    if (fileId && showFull) {
       fetchFile();
     }
     
@@ -576,7 +743,7 @@ function ResumeViewer({ fileId, filename, onClose, token }) {
     return () => {
       if (objectUrl) URL.revokeObjectURL(objectUrl);
     };
-  }, [fileId, token]);
+  }, [fileId, token, showFull]);
 
   const handleDownload = async () => {
     try {
@@ -707,6 +874,23 @@ function ResumeViewer({ fileId, filename, onClose, token }) {
             {filename}
           </h3>
           <div style={{ display: "flex", gap: "0.5rem" }}>
+            {!showFull && (
+              <button
+                onClick={() => setShowFull(true)}
+                style={{
+                  background: "#10b981",
+                  color: "white",
+                  border: "none",
+                  padding: "0.5rem 1rem",
+                  borderRadius: "6px",
+                  cursor: "pointer",
+                  fontSize: "0.9rem",
+                  fontWeight: "500",
+                }}
+              >
+                Open Full File
+              </button>
+            )}
             <button
               onClick={handleDownload}
               style={{
@@ -742,7 +926,49 @@ function ResumeViewer({ fileId, filename, onClose, token }) {
 
         {/* Content */}
         <div style={{ flex: 1, overflow: "hidden", backgroundColor: "#f3f4f6" }}>
-          {fileData && (
+          {!showFull && preview && (
+            <div style={{ height: "100%", display: "flex", gap: "1.5rem", padding: "1.5rem", overflow: "auto" }}>
+              {preview.thumbnail && (
+                <img
+                  src={preview.thumbnail}
+                  alt={`${filename} first page`}
+                  style={{
+                    width: "240px",
+                    alignSelf: "flex-start",
+                    borderRadius: "6px",
+                    boxShadow: "0 2px 8px rgba(0,0,0,0.15)",
+                    backgroundColor: "white",
+                  }}
+                />
+              )}
+              <div style={{ flex: 1, minWidth: 0 }}>
+                <p style={{ marginTop: 0, color: "#6B7280", fontSize: "0.85rem" }}>
+                  {preview.content_type} · {(preview.size / 1024).toFixed(2)} KB
+                </p>
+                {preview.text ? (
+                  <pre
+                    style={{
+                      whiteSpace: "pre-wrap",
+                      fontFamily: "inherit",
+                      fontSize: "0.9rem",
+                      lineHeight: 1.5,
+                      margin: 0,
+                      color: "#232946",
+                    }}
+                  >
+                    {preview.text}
+                    {preview.text_truncated ? "\n…" : ""}
+                  </pre>
+                ) : (
+                  <p>No text preview available. Open the full file to view it.</p>
+                )}
+              </div>
+            </div>
+          )}
+          {showFull && fullLoading && (
+            <div style={{ padding: "2rem", textAlign: "center" }}>Loading file...</div>
+          )}
+          {showFull && !fullLoading && fileData && (
             <>
               {fileData.content_type?.includes("pdf") ? (
                 blobUrl ? (
@@ -771,7 +997,7 @@ function ResumeViewer({ fileId, filename, onClose, token }) {
                   }}
                 >
                   <img
-                    src={`data:${fileData.content_type};base64,${fileData.content}`}
+                    src={blobUrl}
                     alt={filename}
                     style={{
                       maxWidth: "100%",
@@ -1046,7 +1272,7 @@ function App() {
       
       <main className="main-content">
         {currentPage === "resume-screening" && <ResumeScreening token={token} />}
-        {currentPage === "mis-summary" && <MISSummary setViewingFile={setViewingFile} setViewingFilename={setViewingFilename} />}
+        {currentPage === "mis-summary" && <MISSummary setViewingFile={setViewingFile} setViewingFilename={setViewingFilename} token={token} />}
         {currentPage === "daily-reports" && <DailyReports />}
       </main>
 